@@ -1,8 +1,21 @@
-import yfinance as yf
-import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 import hashlib
+import os
 import time
+from quotes import QuoteNotFound, default_provider
+from history_store import default_history_store
+from screener import DEFAULT_UNIVERSE
+from indicators import default_signal_book
+from risk import default_risk_model
+from charts import default_chart_renderer, lttb
+from settings import chart_dir
+from symbols import default_symbol_master
+from alerts import AlertEngine, describe
+from metrics import registry
+from storage import default_account_store
+from ledger import default_ledger
+from trading import TradeError, TradingService
+from positions import PositionBook, ticker_index
 sectors = {
     "Technology": {"AAPL": 0.2, "MSFT": 0.2, "GOOGL": 0.2, "NVDA": 0.2, "META": 0.2},
     "Healthcare": {"PFE": 0.3, "JNJ": 0.3, "MRNA": 0.4},
@@ -16,8 +29,15 @@ class User:
         self.password = hashlib.sha256(password.encode()).hexdigest()
         self.phone_number = phone_number
         self.balance = balance
-        self.portfolio = {}
+        self.portfolio = PositionBook()
         self.watchlist = set()
+        self.id = None
+    @classmethod
+    def from_record(cls, id, name, email, password_hash, phone_number, balance):
+        user = cls(name, email, "", phone_number, balance)
+        user.password = password_hash
+        user.id = id
+        return user
     def check_password(self, password_attempt):
         hashed_attempt = hashlib.sha256(password_attempt.encode()).hexdigest()
         return hashed_attempt == self.password
@@ -48,9 +68,45 @@ class User:
         if phone_number:
             self.phone_number = phone_number
         print("User details updated successfully.")
+    def record_buy(self, ticker, quantity, price):
+        total_cost = price * quantity
+        self.balance -= total_cost
+        if ticker in self.portfolio:
+            existing_quantity, avg_price, existing_investment = self.portfolio[ticker]
+            new_quantity = existing_quantity + quantity
+            new_investment = existing_investment + total_cost
+            new_avg_price = new_investment / new_quantity
+            self.portfolio[ticker] = (new_quantity, new_avg_price, new_investment)
+        else:
+            self.portfolio[ticker] = (quantity, price, total_cost)
+        return total_cost
+    def record_sell(self, ticker, quantity, price):
+        owned_quantity, avg_price, investment = self.portfolio[ticker]
+        sale_value = price * quantity
+        profit_loss = sale_value - avg_price * quantity
+        if quantity == owned_quantity:
+            # Remove stock from portfolio if selling all shares
+            del self.portfolio[ticker]
+        else:
+            # Update quantity and investment, keep avg_price the same
+            self.portfolio[ticker] = (owned_quantity - quantity, avg_price, investment - avg_price * quantity)
+        self.balance += sale_value
+        return sale_value, profit_loss
 class GrowX:
-    def __init__(self, user):
+    def __init__(self, user, quotes=None, history=None, trading=None):
         self.user = user
+        self.quotes = quotes or default_provider()
+        self.history = history or default_history_store(self.quotes)
+        self.signals = default_signal_book()
+        self.risk = default_risk_model(self.history)
+        self.charts = default_chart_renderer(self.history)
+        self.symbols = default_symbol_master()
+        # Without an account store or ledger, changes stay in memory only
+        self.trading = trading or TradingService(self.quotes)
+        if self.trading.accounts is not None and user.id is not None:
+            self.alerts = AlertEngine.from_rows(self.trading.accounts.alerts(user))
+        else:
+            self.alerts = AlertEngine()
         self.running = True
     def display_menu(self):
         print("\n" + "=" * 40)
@@ -74,27 +130,46 @@ class GrowX:
     def add_money(self):
         try:
             amount = float(input("Enter amount to add: $"))
-            self.user.add_money(amount)
+            self.trading.deposit(self.user, amount)
+            print(f"Successfully added ${amount}. New balance: ${self.user.balance}")
+        except TradeError as e:
+            print(e)
         except ValueError:
             print("Please enter a valid amount.")
     def withdraw_money(self):
         try:
             amount = float(input("Enter amount to withdraw: $"))
-            self.user.withdraw_money(amount)
+            self.trading.withdraw(self.user, amount)
+            print(f"Successfully withdrew ${amount}. New balance: ${self.user.balance}")
+        except TradeError as e:
+            print(e)
         except ValueError:
             print("Please enter a valid amount.")
     
+    def is_listed(self, ticker):
+        # Checked against the local symbol listing, without a network round-trip
+        if self.symbols is None or self.symbols.exists(ticker):
+            return True
+        print(f"Could not find data for ticker: {ticker}")
+        suggestions = self.symbols.search(ticker, 5)
+        if suggestions:
+            print("Did you mean: " + ", ".join(f"{symbol} ({name})" for symbol, name in suggestions))
+        return False
+    
     def view_stock(self):
         ticker = input("Enter stock ticker symbol (e.g., AAPL): ").upper()
-        try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            if 'regularMarketPrice' not in info:
+        if self.symbols is not None:
+            if not self.is_listed(ticker):
+                return
+        else:
+            try:
+                self.quotes.get_price(ticker)
+            except QuoteNotFound:
                 print(f"Could not find data for ticker: {ticker}")
                 return
-        except Exception as e:
-            print(f"Error retrieving stock data: {e}")
-            return
+            except Exception as e:
+                print(f"Error retrieving stock data: {e}")
+                return
         print("\nSelect time period:")
         print("1. 1 Day")
         print("2. 5 Days")
@@ -112,12 +187,19 @@ class GrowX:
         if choice in periods:
             period = periods[choice]
             try:
-                hist = stock.history(period=period)
+                hist = self.history.get_history(ticker, period)
                 if hist.empty:
                     print(f"No data available for {ticker} for the selected period.")
                     return
+                if chart_dir():
+                    print(f"Chart saved to {self.charts.save(ticker, chart_dir(), period)}")
+                    print(f"\nLatest price for {ticker}: ${hist['Close'].iloc[-1]:.2f}")
+                    return
+                import matplotlib.pyplot as plt
+                # Plot about one point per pixel instead of every bar
+                kept = lttb(hist.index.asi8, hist['Close'].to_numpy(), 800)
                 plt.figure(figsize=(8, 8))
-                plt.plot(hist.index, hist['Close'])
+                plt.plot(hist.index[kept], hist['Close'].iloc[kept])
                 plt.title(f"{ticker} Stock Price - {period}")
                 plt.xlabel('Date')
                 plt.ylabel('Price ($)')
@@ -133,17 +215,17 @@ class GrowX:
     
     def buy_stock(self):
         ticker = input("Enter stock ticker to buy (e.g., AAPL): ").upper()
+        if not self.is_listed(ticker):
+            return
         
         try:
-            # Get stock information
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            
-            if 'regularMarketPrice' not in info:
+            # Get stock price
+            try:
+                current_price = self.quotes.get_price(ticker)
+            except QuoteNotFound:
                 print(f"Could not find data for ticker: {ticker}")
                 return
             
-            current_price = info['regularMarketPrice']
             print(f"Current price of {ticker}: ${current_price:.2f}")
             
             # Ask for quantity
@@ -156,28 +238,14 @@ class GrowX:
                 print("Please enter a valid quantity.")
                 return
             
-            # Calculate total cost
-            total_cost = current_price * quantity
-            
-            # Check if user has enough balance
-            if total_cost > self.user.balance:
-                print(f"Insufficient funds. Required: ${total_cost:.2f}, Available: ${self.user.balance:.2f}")
+            # Update balance and portfolio; fails if the balance doesn't cover the cost
+            try:
+                result = self.trading.buy(self.user, ticker, quantity, current_price)
+            except TradeError as e:
+                print(e)
                 return
             
-            # Update user's balance
-            self.user.balance -= total_cost
-            
-            # Update portfolio
-            if ticker in self.user.portfolio:
-                existing_quantity, avg_price, existing_investment = self.user.portfolio[ticker]
-                new_quantity = existing_quantity + quantity
-                new_investment = existing_investment + total_cost
-                new_avg_price = new_investment / new_quantity
-                self.user.portfolio[ticker] = (new_quantity, new_avg_price, new_investment)
-            else:
-                self.user.portfolio[ticker] = (quantity, current_price, total_cost)
-            
-            print(f"Successfully purchased {quantity} shares of {ticker} for ${total_cost:.2f}")
+            print(f"Successfully purchased {quantity} shares of {ticker} for ${result['total_cost']:.2f}")
             print(f"New balance: ${self.user.balance:.2f}")
             
         except Exception as e:
@@ -216,33 +284,16 @@ class GrowX:
             
             # Get current price
             try:
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                current_price = info['regularMarketPrice']
+                current_price = self.quotes.get_price(ticker)
                 print(f"Current price of {ticker}: ${current_price:.2f}")
             except Exception as e:
                 print(f"Error retrieving current price: {e}")
                 return
             
-            # Calculate sale value
-            sale_value = current_price * quantity_to_sell
-            
-            # Calculate profit/loss
-            cost_basis = avg_price * quantity_to_sell
-            profit_loss = sale_value - cost_basis
-            
-            # Update portfolio
-            if quantity_to_sell == owned_quantity:
-                # Remove stock from portfolio if selling all shares
-                del self.user.portfolio[ticker]
-            else:
-                # Update quantity and investment, keep avg_price the same
-                new_quantity = owned_quantity - quantity_to_sell
-                new_investment = investment - (avg_price * quantity_to_sell)
-                self.user.portfolio[ticker] = (new_quantity, avg_price, new_investment)
-            
-            # Update balance
-            self.user.balance += sale_value
+            # Update portfolio and balance
+            result = self.trading.sell(self.user, ticker, quantity_to_sell, current_price)
+            sale_value = result["sale_value"]
+            profit_loss = result["profit_loss"]
             
             print(f"\nSuccessfully sold {quantity_to_sell} shares of {ticker} for ${sale_value:.2f}")
             if profit_loss > 0:
@@ -261,35 +312,27 @@ class GrowX:
             print("You don't own any stocks.")
             return
         
-        total_current_value = 0
-        total_investment = 0
-        
         print("\n" + "=" * 60)
         print("PORTFOLIO SUMMARY".center(60))
         print("=" * 60)
         print(f"{'Stock':<10} {'Shares':<10} {'Avg Price':<15} {'Current':<15} {'Value':<15} {'P/L':<15}")
         print("-" * 60)
         
-        # For pie chart
-        stock_values = {}
+        # Fetch every holding's price in one batch and value all positions with one vector product
+        prices, errors = self.quotes.get_prices(self.user.portfolio)
+        quotes = ticker_index.quote_vector(prices)
+        values = self.user.portfolio.market_values(quotes)
         
-        for ticker, (quantity, avg_price, investment) in self.user.portfolio.items():
-            try:
-                # Get current price
-                stock = yf.Ticker(ticker)
-                info = stock.info
-                current_price = info['regularMarketPrice']
-                
-                current_value = current_price * quantity
-                profit_loss = current_value - investment
-                profit_loss_percent = (profit_loss / investment) * 100 if investment > 0 else 0
-                
-                print(f"{ticker:<10} {quantity:<10} ${avg_price:<14.2f} ${current_price:<14.2f} ${current_value:<14.2f} ${profit_loss:<10.2f} ({profit_loss_percent:+.2f}%)")
-                total_current_value += current_value
-                total_investment += investment
-                stock_values[ticker] = current_value
-            except Exception as e:
-                print(f"Error retrieving data for {ticker}: {e}")
+        for (ticker, (quantity, avg_price, investment)), current_value in zip(self.user.portfolio.items(), values):
+            if ticker in errors:
+                print(f"Error retrieving data for {ticker}: {errors[ticker]}")
+                continue
+            current_price = prices[ticker]
+            profit_loss = current_value - investment
+            profit_loss_percent = (profit_loss / investment) * 100 if investment > 0 else 0
+            
+            print(f"{ticker:<10} {quantity:<10} ${avg_price:<14.2f} ${current_price:<14.2f} ${current_value:<14.2f} ${profit_loss:<10.2f} ({profit_loss_percent:+.2f}%)")
+        total_current_value, total_investment = self.user.portfolio.totals(quotes)
         print("-" * 60)
         total_profit_loss = total_current_value - total_investment
         total_profit_loss_percent = (total_profit_loss / total_investment) * 100 if total_investment > 0 else 0
@@ -298,9 +341,35 @@ class GrowX:
         print(f"Cash Balance: ${self.user.balance:.2f}")
         print(f"Total Account Value: ${(total_current_value + self.user.balance):.2f}")
         print("=" * 60)
-        if stock_values:
+        priced = ~np.isnan(values)
+        try:
+            risk = self.risk.portfolio_risk(dict(zip(self.user.portfolio.keys(), values)))
+        except ValueError as e:
+            print(f"Risk metrics unavailable: {e}")
+        else:
+            print("RISK (1 year of daily returns)".center(60))
+            print("-" * 60)
+            print(f"Annual Volatility: {risk['volatility'] * 100:.2f}%")
+            print(f"Beta vs {self.risk.benchmark}: {risk['beta']:.2f}")
+            print(f"1-day {risk['confidence']:.0%} VaR (historical): ${risk['historical_var']:.2f}")
+            print(f"1-day {risk['confidence']:.0%} VaR (parametric): ${risk['parametric_var']:.2f}")
+            print(f"{'Stock':<10} {'Weight':<12} {'Beta':<10} {'Risk Share':<12}")
+            for ticker, position in risk["positions"].items():
+                print(f"{ticker:<10} {position['weight'] * 100:>6.2f}%{'':<5} {position['beta']:<10.2f} {position['risk_contribution'] * 100:.2f}%")
+            print("=" * 60)
+        # For pie chart
+        if priced.any():
+            labels = [ticker for ticker, has_price in zip(self.user.portfolio.keys(), priced) if has_price]
+            if chart_dir():
+                os.makedirs(chart_dir(), exist_ok=True)
+                path = os.path.join(chart_dir(), f"{self.user.name}-portfolio.png")
+                with open(path, "wb") as f:
+                    f.write(self.charts.render_allocation(labels, values[priced], f"{self.user.name}'s Portfolio Distribution"))
+                print(f"Chart saved to {path}")
+                return
+            import matplotlib.pyplot as plt
             plt.figure(figsize=(8, 6))
-            plt.pie(stock_values.values(), labels=stock_values.keys(), autopct="%1.1f%%", startangle=140, colors=plt.cm.Paired.colors)
+            plt.pie(values[priced], labels=labels, autopct="%1.1f%%", startangle=140, colors=plt.cm.Paired.colors)
             plt.title(f"{self.user.name}'s Portfolio Distribution")
             plt.axis("equal")
             plt.show()
@@ -322,69 +391,33 @@ class GrowX:
             allocation = sectors[choice]
             print(f"Investing ${amount:.2f} in {choice} sector.")
             
+            purchases, errors = self.trading.sip(self.user, allocation, amount)
+            for ticker, e in errors.items():
+                print(f"Error fetching data for {ticker}: {str(e)}")
             total_invested = 0
-            
-            for ticker, percentage in allocation.items():
-                invest_amount = amount * percentage
-                try:
-                    stock = yf.Ticker(ticker)
-                    price = stock.history(period="1d")["Close"][-1]
-                    quantity = invest_amount // price
-                    
-                    if quantity > 0:
-                        total_cost = quantity * price
-                        total_invested += total_cost
-                        
-                        # Update portfolio
-                        if ticker in self.user.portfolio:
-                            existing_quantity, avg_price, existing_investment = self.user.portfolio[ticker]
-                            new_quantity = existing_quantity + quantity
-                            new_investment = existing_investment + total_cost
-                            new_avg_price = new_investment / new_quantity
-                            self.user.portfolio[ticker] = (new_quantity, new_avg_price, new_investment)
-                        else:
-                            self.user.portfolio[ticker] = (quantity, price, total_cost)
-                        print(f"Bought {int(quantity)} shares of {ticker} at ${price:.2f} each. Total: ${total_cost:.2f}")
-                except Exception as e:
-                    print(f"Error fetching data for {ticker}: {str(e)}")
-            self.user.balance -= total_invested
+            for purchase in purchases:
+                total_invested += purchase["total_cost"]
+                print(f"Bought {int(purchase['quantity'])} shares of {purchase['ticker']} at ${purchase['price']:.2f} each. Total: ${purchase['total_cost']:.2f}")
             print(f"SIP investment completed! Total invested: ${total_invested:.2f}")
             print(f"New balance: ${self.user.balance:.2f}")
             
+            if self.trading.accounts is not None:
+                repeat = input("Repeat this investment every month? (y/n): ").lower()
+                if repeat == 'y':
+                    self.trading.subscribe_sip(self.user, choice, amount)
+                    print(f"Monthly SIP of ${amount:.2f} in {choice} scheduled.")
+            
         except ValueError:
             print("Please enter a valid amount.")
     
     def stock_recommendation(self):
         print("\nStock Recommendations\n")
-        stock_list = ["AAPL", "MSFT", "GOOGL", "TSLA", "AMZN", "META", "NVDA", "PFE", "JNJ", "MRNA", "F", "GM"]
-        recommendations = []
-
-        for ticker in stock_list:
-            try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1y")
-                if hist.empty:
-                    continue
-                hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
-                hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
-                
-                latest_price = hist['Close'][-1]
-                sma_20 = hist['SMA_20'][-1]
-                sma_50 = hist['SMA_50'][-1]
+        # Only bars newer than the last refresh are fed into the running indicators
+        errors = self.signals.sync(self.history, DEFAULT_UNIVERSE)
+        for ticker, e in errors.items():
+            print(f"Error fetching data for {ticker}: {str(e)}")
+        recommendations = self.signals.recommendations(DEFAULT_UNIVERSE)
 
-                # Rule-based recommendation:
-                # - If SMA_20 > SMA_50, the stock is in an uptrend
-                # - If SMA_20 < SMA_50, the stock is in a downtrend
-                if sma_20 > sma_50:
-                    recommendations.append((ticker, latest_price, "Strong Buy"))
-                elif sma_20 < sma_50:
-                    recommendations.append((ticker, latest_price, "Avoid"))
-                else:
-                    recommendations.append((ticker, latest_price, "Neutral"))
-
-            except Exception as e:
-                print(f"Error fetching data for {ticker}: {str(e)}")
-                
         if recommendations:
             print("\nRecommended Stocks:")
             for stock in recommendations:
@@ -394,30 +427,106 @@ class GrowX:
     
     def add_to_watchlist(self):
         ticker = input("Enter stock ticker to add to watchlist: ").upper()
+        if self.symbols is not None:
+            if not self.is_listed(ticker):
+                return
+        else:
+            try:
+                self.quotes.get_price(ticker)
+            except QuoteNotFound:
+                print(f"Could not find data for ticker: {ticker}")
+                return
+            except Exception as e:
+                print(f"Error retrieving stock data: {e}")
+                return
         self.user.watchlist.add(ticker)
+        if self.trading.accounts is not None:
+            self.trading.accounts.add_to_watchlist(self.user, ticker)
         print(f"{ticker} added to your watchlist.")
     
     def remove_from_watchlist(self):
         ticker = input("Enter stock ticker to remove from watchlist: ").upper()
         if ticker in self.user.watchlist:
             self.user.watchlist.remove(ticker)
+            # Alerts are only allowed on watchlist stocks, so they go with it
+            cancelled = self.alerts.cancel_ticker(self.user.name, ticker)
+            if self.trading.accounts is not None:
+                self.trading.accounts.remove_from_watchlist(self.user, ticker)
+                self.trading.accounts.remove_ticker_alerts(self.user, ticker)
             print(f"{ticker} removed from your watchlist.")
+            if cancelled:
+                print(f"Cancelled {len(cancelled)} price alert(s) on {ticker}.")
         else:
             print("Stock not found in your watchlist.")
     
+    def set_price_alert(self):
+        ticker = input("Enter watchlist stock ticker for the alert: ").upper()
+        if ticker not in self.user.watchlist:
+            print("Alerts can only be set on stocks in your watchlist.")
+            return
+        direction = input("Alert when price goes above or below? (above/below): ").lower()
+        if direction not in ("above", "below"):
+            print("Please enter above or below.")
+            return
+        try:
+            threshold = float(input("Enter price: $"))
+            if threshold <= 0:
+                print("Price must be positive.")
+                return
+        except ValueError:
+            print("Please enter a valid price.")
+            return
+        alert_id = None
+        if self.trading.accounts is not None:
+            alert_id = self.trading.accounts.add_alert(self.user, ticker, direction, threshold)
+        alert_id = self.alerts.add(self.user.name, ticker, direction, threshold, alert_id)
+        print(f"Alert set: {describe(self.alerts.alerts[alert_id])}")
+    
+    def view_alerts(self):
+        alerts = self.alerts.for_user(self.user.name)
+        if not alerts:
+            print("You have no price alerts.")
+            return
+        print("\nYour Alerts:")
+        for alert in alerts:
+            print(f"{alert[0]}. {describe(alert)}")
+        choice = input("Enter an alert number to cancel it, or press Enter to go back: ")
+        if not choice:
+            return
+        try:
+            alert_id = int(choice)
+        except ValueError:
+            print("Invalid choice.")
+            return
+        if self.alerts.cancel(alert_id, self.user.name):
+            if self.trading.accounts is not None:
+                self.trading.accounts.remove_alerts([alert_id])
+            print("Alert cancelled.")
+        else:
+            print("Alert not found.")
+    
     def view_watchlist(self):
         if not self.user.watchlist:
             print("Your watchlist is empty.")
             return
         
         print("\nYour Watchlist:")
+        prices, errors = self.quotes.get_prices(self.user.watchlist)
         for ticker in self.user.watchlist:
-            try:
-                stock = yf.Ticker(ticker)
-                price = stock.history(period="1d")["Close"][-1]
-                print(f"{ticker}: ${price:.2f}")
-            except Exception as e:
-                print(f"Error fetching price for {ticker}: {str(e)}")
+            if ticker in prices:
+                print(f"{ticker}: ${prices[ticker]:.2f}")
+            else:
+                print(f"Error fetching price for {ticker}: {str(errors[ticker])}")
+        triggered = self.alerts.on_prices(prices)
+        for alert in triggered:
+            print(f"ALERT: {describe(alert, prices[alert[2]])}")
+        if triggered and self.trading.accounts is not None:
+            self.trading.accounts.remove_alerts([alert[0] for alert in triggered])
+        if chart_dir():
+            paths, errors = self.charts.save_many(self.user.watchlist, chart_dir())
+            print(f"Saved {len(paths)} watchlist charts to {chart_dir()}")
+            for ticker, e in errors.items():
+                print(f"Error plotting {ticker}: {e}")
     
     def manage_watchlist(self):
         while True:
@@ -425,7 +534,9 @@ class GrowX:
             print("1. View Watchlist")
             print("2. Add Stock to Watchlist")
             print("3. Remove Stock from Watchlist")
-            print("4. Back to Main Menu")
+            print("4. Set Price Alert")
+            print("5. View/Cancel Alerts")
+            print("6. Back to Main Menu")
             
             choice = input("Enter your choice: ")
             if choice == "1":
@@ -435,6 +546,10 @@ class GrowX:
             elif choice == "3":
                 self.remove_from_watchlist()
             elif choice == "4":
+                self.set_price_alert()
+            elif choice == "5":
+                self.view_alerts()
+            elif choice == "6":
                 break
             else:
                 print("Invalid choice. Try again.")
@@ -473,6 +588,9 @@ class GrowX:
             }
             
             if choice in actions:
+                # Counted, not timed: handlers block on input(), and their real work is
+                # covered by the trade, quote and history timers
+                registry.inc("growx_operations_total", op=actions[choice].__name__)
                 actions[choice]()
             else:
                 print("Invalid choice. Please try again.")
@@ -480,8 +598,11 @@ class GrowX:
         
         return False
 class StockMarketApp:
-    def __init__(self):
-        self.users = {}
+    def __init__(self, quotes=None, history=None, accounts=None, ledger=None):
+        self.accounts = accounts or default_account_store()
+        self.quotes = quotes or default_provider()
+        self.history = history or default_history_store(self.quotes)
+        self.trading = TradingService(self.quotes, self.accounts, ledger or default_ledger(), User.from_record)
         self.current_user = None
         self.running = True
     def display_welcome(self):
@@ -494,39 +615,45 @@ class StockMarketApp:
         print("-" * 40)
     def login(self):
         name = input("Enter your name: ")
-        if name not in self.users:
+        record = self.accounts.find_user(name)
+        if record is None:
             print("User not found. Please sign up first.")
             return
         password = input("Enter your password: ")
-        user = self.users[name]
+        user = User.from_record(*record)
         if user.check_password(password):
             print(f"Welcome back, {name}!")
+            # Positions and watchlist are only loaded once the password checks out
+            self.accounts.load_portfolio(user)
             self.current_user = user
-            platform = GrowX(user)
+            platform = GrowX(user, self.quotes, self.history, self.trading)
             if platform.run():
                 self.running = False
         else:
             print("Incorrect password. Please try again.")
     def signup(self):
         name = input("Enter your name: ")
-        if name in self.users:
+        if self.accounts.exists(name):
             print("User already exists. Please use a different name or login.")
             return
         email = input("Enter your email: ")
         password = input("Enter your password: ")
         phone_number = input("Enter your phone number: ")
         user = User(name, email, password, phone_number)
-        self.users[name] = user
+        self.accounts.create_user(user)
         print(f"Account created successfully. Welcome, {name}!")
         try:
             initial_deposit = input("Would you like to add initial funds? (y/n): ").lower()
             if initial_deposit == 'y':
                 amount = float(input("Enter amount to deposit: $"))
-                user.add_money(amount)
+                self.trading.deposit(user, amount)
+                print(f"Successfully added ${amount}. New balance: ${user.balance}")
+        except TradeError as e:
+            print(e)
         except ValueError:
             print("Invalid amount. No funds added.")
         self.current_user = user
-        platform = GrowX(user)
+        platform = GrowX(user, self.quotes, self.history, self.trading)
         if platform.run():
             self.running = False
     def exit_app(self):
@@ -538,8 +665,10 @@ class StockMarketApp:
             self.display_welcome()
             choice = input("Enter your choice (1-3): ")
             if choice == '1':
+                registry.inc("growx_operations_total", op="login")
                 self.login()
             elif choice == '2':
+                registry.inc("growx_operations_total", op="signup")
                 self.signup()
             elif choice == '3':
                 self.exit_app()
@@ -0,0 +1,118 @@
+import threading
+from bisect import bisect_left
+DIRECTIONS = ("above", "below")
+class AlertEngine:
+    # One-shot price alerts. Each ticker keeps two sorted key lists, arranged so the
+    # alerts a price crosses are always a suffix: "above" alerts keyed by -threshold
+    # and "below" alerts keyed by threshold. A tick is a bisect plus popping the
+    # triggered suffix, O(log n + k), however many alerts are registered.
+    # Cancelled alerts are skipped lazily and compacted away once they pile up.
+    def __init__(self):
+        self.alerts = {}
+        self._keys = {}
+        self._ids = {}
+        self._dead = {}
+        self._by_user = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+    def __len__(self):
+        return len(self.alerts)
+    def add(self, user, ticker, direction, threshold, alert_id=None):
+        ticker = ticker.upper()
+        if direction not in DIRECTIONS:
+            raise ValueError("Direction must be 'above' or 'below'.")
+        threshold = float(threshold)
+        if threshold <= 0:
+            raise ValueError("Threshold must be positive.")
+        with self._lock:
+            if alert_id is None:
+                alert_id = self._next_id
+            self._next_id = max(self._next_id, alert_id + 1)
+            side = (ticker, direction)
+            key = -threshold if direction == "above" else threshold
+            keys = self._keys.setdefault(side, [])
+            i = bisect_left(keys, key)
+            keys.insert(i, key)
+            self._ids.setdefault(side, []).insert(i, alert_id)
+            self.alerts[alert_id] = (alert_id, user, ticker, direction, threshold)
+            self._by_user.setdefault(user, set()).add(alert_id)
+            return alert_id
+    def cancel(self, alert_id, user=None):
+        with self._lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None or (user is not None and alert[1] != user):
+                return False
+            del self.alerts[alert_id]
+            self._by_user[alert[1]].discard(alert_id)
+            side = (alert[2], alert[3])
+            self._dead[side] = self._dead.get(side, 0) + 1
+            if self._dead[side] * 2 > len(self._ids[side]):
+                self._compact(side)
+            return True
+    def _compact(self, side):
+        live = [(key, alert_id) for key, alert_id in zip(self._keys[side], self._ids[side]) if alert_id in self.alerts]
+        self._keys[side] = [key for key, _ in live]
+        self._ids[side] = [alert_id for _, alert_id in live]
+        self._dead[side] = 0
+    def _pop_from(self, side, key):
+        keys = self._keys.get(side)
+        if not keys:
+            return []
+        i = bisect_left(keys, key)
+        if i == len(keys):
+            return []
+        ids = self._ids[side]
+        fired = ids[i:]
+        del keys[i:]
+        del ids[i:]
+        triggered = []
+        for alert_id in fired:
+            alert = self.alerts.pop(alert_id, None)
+            if alert is None:
+                self._dead[side] -= 1
+                continue
+            self._by_user[alert[1]].discard(alert_id)
+            triggered.append(alert)
+        return triggered
+    def on_price(self, ticker, price):
+        # Returns the (alert id, user, ticker, direction, threshold) alerts this price crossed
+        ticker = ticker.upper()
+        with self._lock:
+            return self._pop_from((ticker, "above"), -price) + self._pop_from((ticker, "below"), price)
+    def on_prices(self, prices):
+        triggered = []
+        for ticker, price in prices.items():
+            triggered.extend(self.on_price(ticker, price))
+        return triggered
+    def for_user(self, user):
+        with self._lock:
+            return sorted(self.alerts[alert_id] for alert_id in self._by_user.get(user, ()))
+    def cancel_ticker(self, user, ticker):
+        # Cancels all of a user's alerts on one ticker; returns their ids
+        ids = [alert[0] for alert in self.for_user(user) if alert[2] == ticker.upper()]
+        for alert_id in ids:
+            self.cancel(alert_id, user)
+        return ids
+    def tickers(self):
+        with self._lock:
+            return sorted({alert[2] for alert in self.alerts.values()})
+    @classmethod
+    def from_rows(cls, rows):
+        # Bulk load: collect every side unsorted, then sort each side once
+        engine = cls()
+        sides = {}
+        for alert_id, user, ticker, direction, threshold in rows:
+            ticker = ticker.upper()
+            engine.alerts[alert_id] = (alert_id, user, ticker, direction, threshold)
+            engine._by_user.setdefault(user, set()).add(alert_id)
+            sides.setdefault((ticker, direction), []).append((-threshold if direction == "above" else threshold, alert_id))
+            engine._next_id = max(engine._next_id, alert_id + 1)
+        for side, entries in sides.items():
+            entries.sort()
+            engine._keys[side] = [key for key, _ in entries]
+            engine._ids[side] = [alert_id for _, alert_id in entries]
+        return engine
+def describe(alert, price=None):
+    alert_id, _, ticker, direction, threshold = alert
+    text = f"{ticker} {direction} ${threshold:.2f}"
+    return f"{text} (now ${price:.2f})" if price is not None else text
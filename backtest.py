@@ -0,0 +1,134 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from screener import align_closes, sma
+TRADING_DAYS = 252
+def summarize(returns, turnover):
+    # returns and turnover are per-day arrays; the first day is the start of the test
+    equity = np.cumprod(1 + returns)
+    peak = np.maximum.accumulate(equity)
+    years = len(returns) / TRADING_DAYS
+    total_return = float(equity[-1] - 1) if len(equity) else 0.0
+    volatility = float(returns.std() * np.sqrt(TRADING_DAYS)) if len(returns) > 1 else 0.0
+    return {
+        "total_return": total_return,
+        "cagr": float((1 + total_return) ** (1 / years) - 1) if years > 0 and total_return > -1 else 0.0,
+        "volatility": volatility,
+        "sharpe": float(returns.mean() * TRADING_DAYS / volatility) if volatility else 0.0,
+        "max_drawdown": float((equity / peak - 1).min()) if len(equity) else 0.0,
+        "turnover": float(turnover.sum() / years) if years > 0 else 0.0,
+    }
+def daily_returns(prices):
+    returns = np.zeros_like(prices)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = prices[1:] / prices[:-1] - 1
+    return np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+def sma_crossover(prices, short_window=20, long_window=50):
+    # Equal weight across the tickers whose short SMA is above the long SMA; the
+    # rest of the capital sits in cash. Signals act on the next day's return.
+    short = sma(prices, short_window)
+    long = sma(prices, long_window)
+    invested = short > long
+    counts = invested.sum(axis=1, keepdims=True)
+    weights = np.where(invested, 1.0 / prices.shape[1], 0.0)
+    held = np.zeros_like(weights)
+    held[1:] = weights[:-1]
+    returns = (held * daily_returns(prices)).sum(axis=1)
+    turnover = np.abs(np.diff(weights, axis=0, prepend=0.0)).sum(axis=1)
+    start = long_window
+    result = summarize(returns[start:], turnover[start:])
+    result["avg_invested"] = float(counts[start:].mean() / prices.shape[1]) if len(prices) > start else 0.0
+    return result
+def sector_sip(prices, dates, weights, amount=1000.0):
+    # Buys amount * weight of each ticker (fractionally) on the first trading day
+    # of every month. Returns are time-weighted so contributions don't count as gains.
+    days = np.asarray(dates).astype("datetime64[ns]").astype("datetime64[M]")
+    first_of_month = np.ones(len(dates), dtype=bool)
+    first_of_month[1:] = days[1:] != days[:-1]
+    priced = ~np.isnan(prices)
+    safe_prices = np.where(priced, prices, 1.0)
+    contributions = np.where(first_of_month[:, None] & priced, amount * weights[None, :], 0.0)
+    shares = np.cumsum(contributions / safe_prices, axis=0)
+    value = (shares * np.where(priced, prices, 0.0)).sum(axis=1)
+    flows = contributions.sum(axis=1)
+    returns = np.zeros(len(value))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = np.where(value[:-1] > 0, (value[1:] - flows[1:]) / value[:-1] - 1, 0.0)
+    turnover = np.where(value > 0, flows / np.where(value > 0, value, 1.0), 0.0)
+    result = summarize(returns, turnover)
+    result["invested"] = float(flows.sum())
+    result["final_value"] = float(value[-1]) if len(value) else 0.0
+    return result
+_worker_data = {}
+def _init_worker(dates, tickers, prices):
+    _worker_data["dates"] = dates
+    _worker_data["tickers"] = tickers
+    _worker_data["prices"] = prices
+def _run_one(task):
+    kind, params = task
+    dates, tickers, prices = _worker_data["dates"], _worker_data["tickers"], _worker_data["prices"]
+    if kind == "sma":
+        result = sma_crossover(prices, params["short_window"], params["long_window"])
+    else:
+        weights = np.array([params["weights"].get(ticker, 0.0) for ticker in tickers])
+        result = sector_sip(prices, dates, weights, params["amount"])
+    return {"strategy": kind, **params, **result}
+def run_grid(dates, tickers, prices, tasks, workers=None):
+    # tasks: list of ("sma", {"short_window", "long_window"}) or ("sip", {"weights", "amount"}).
+    # The price matrix is sent to each worker process once, not once per task.
+    tasks = list(tasks)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(dates, tickers, prices)
+        return [_run_one(task) for task in tasks]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dates, tickers, prices)) as pool:
+        return list(pool.map(_run_one, tasks, chunksize=chunksize))
+def sma_grid(short_windows, long_windows):
+    return [
+        ("sma", {"short_window": short, "long_window": long})
+        for short, long in itertools.product(short_windows, long_windows) if short < long
+    ]
+def sip_grid(weight_sets, amounts):
+    return [("sip", {"weights": weights, "amount": amount}) for weights, amount in itertools.product(weight_sets, amounts)]
+def main(argv=None):
+    from GrowX import sectors
+    from quotes import LocalQuoteProvider, default_provider
+    from history_store import HistoryStore
+    from screener import DEFAULT_UNIVERSE
+    parser = argparse.ArgumentParser(description="Backtest SMA crossover and sector SIP strategies over a parameter grid.")
+    parser.add_argument("strategy", choices=["sma", "sip"])
+    parser.add_argument("--tickers", nargs="+", help="universe for the SMA strategy (default: recommendation universe)")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--short", type=int, nargs="+", default=[10, 20, 30, 50])
+    parser.add_argument("--long", type=int, nargs="+", default=[50, 100, 150, 200])
+    parser.add_argument("--sectors", nargs="+", help="sectors for the SIP strategy (default: all)")
+    parser.add_argument("--weights", help="JSON file with a list of {ticker: weight} sets to try instead of the sector weights")
+    parser.add_argument("--amounts", type=float, nargs="+", default=[500.0, 1000.0])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--data-dir", help="directory for price history")
+    parser.add_argument("--offline", action="store_true", help="use deterministic local prices instead of Yahoo Finance")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    store = HistoryStore(LocalQuoteProvider() if args.offline else default_provider())
+    if args.strategy == "sma":
+        tickers = args.tickers or DEFAULT_UNIVERSE
+        tasks = sma_grid(args.short, args.long)
+    else:
+        if args.weights:
+            with open(args.weights) as f:
+                weight_sets = json.load(f)
+        else:
+            weight_sets = [sectors[name.capitalize()] for name in (args.sectors or sectors)]
+        tickers = sorted({ticker for weights in weight_sets for ticker in weights})
+        tasks = sip_grid(weight_sets, args.amounts)
+    dates, tickers, prices, errors = align_closes(store, tickers, args.period)
+    for ticker, e in errors.items():
+        print(f"Error fetching data for {ticker}: {e}")
+    print(json.dumps(run_grid(dates, tickers, prices, tasks, args.workers), indent=2))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from GrowX import User, sectors
+from quotes import PERIOD_DAYS, LocalQuoteProvider
+from history_store import HistoryStore
+from storage import AccountStore
+from ledger import Ledger
+from trading import TradingService
+from positions import PositionBook, ticker_index
+from indicators import SignalBook
+from screener import Screener
+from server import percentile
+class Fixtures:
+    # A throwaway data directory with a deterministic synthetic market: `users`
+    # accounts holding a few positions each, one account holding `positions`
+    # tickers, and a `universe` of tickers with price history
+    def __init__(self, root, users=100_000, positions=10_000, universe=1000, seed=0, fsync=False):
+        self.rng = random.Random(seed)
+        self.quotes = LocalQuoteProvider(history_days=PERIOD_DAYS["2y"])
+        self.history = HistoryStore(self.quotes, root=os.path.join(root, "history"), backfill_period="2y")
+        self.accounts = AccountStore(os.path.join(root, "accounts.db"))
+        self.ledger = Ledger(os.path.join(root, "ledger.jsonl"), fsync=fsync)
+        self.trading = TradingService(self.quotes, self.accounts, self.ledger, User.from_record)
+        self.universe = [f"U{i:04d}" for i in range(universe)]
+        self.names = [f"bench{i}" for i in range(users)]
+        self.build_users()
+        self.whale = self.build_whale(positions)
+    def build_users(self):
+        prices, _ = self.quotes.get_prices(self.universe)
+        chunk = []
+        for name in self.names:
+            user = User(name, f"{name}@example.com", "bench", "0000000000", 1_000_000)
+            for ticker in self.rng.sample(self.universe, 5):
+                user.portfolio[ticker] = (10, prices[ticker], 10 * prices[ticker])
+            chunk.append(user)
+            if len(chunk) == 10_000:
+                self._save(chunk)
+                chunk = []
+        self._save(chunk)
+    def _save(self, users):
+        if users:
+            self.accounts.create_users(users)
+            self.accounts.record_trades([
+                (user, 0, {ticker: (quantity, investment) for ticker, (quantity, _, investment) in user.portfolio.items()})
+                for user in users
+            ])
+    def build_whale(self, positions):
+        book = PositionBook()
+        for i in range(positions):
+            book[f"P{i:05d}"] = (self.rng.randint(1, 100), 100.0, 100.0 * self.rng.randint(1, 100))
+        return book
+    def close(self):
+        self.ledger.close()
+        self.accounts.close()
+def measure(fn, iterations, memory_iterations=20):
+    # Timed pass first, then a short tracemalloc pass, which slows everything down
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        began = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    try:
+        for i in range(min(iterations, memory_iterations)):
+            fn(iterations + i)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_s": iterations / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_kb": peak / 1024,
+    }
+def run_benchmarks(fixtures, iterations=1000, only=None):
+    rng = random.Random(1)
+    trading = fixtures.trading
+    universe = fixtures.universe
+    users = {}
+    def user(i):
+        name = fixtures.names[i % len(fixtures.names)]
+        if name not in users:
+            users[name] = trading.load_user(name)
+        return users[name]
+    def login(i):
+        trading.load_user(fixtures.names[rng.randrange(len(fixtures.names))])
+    def buy(i):
+        trading.buy(user(i), universe[i % len(universe)], 1)
+    def sell(i):
+        account = user(i)
+        trading.sell(account, next(iter(account.portfolio)), 1)
+    def calculate_portfolio(i):
+        prices, _ = fixtures.quotes.get_prices(fixtures.whale)
+        quotes = ticker_index.quote_vector(prices)
+        fixtures.whale.market_values(quotes)
+        fixtures.whale.totals(quotes)
+    def sip_investment(i):
+        trading.sip(user(i), sectors["Technology"], 1000)
+    signals = SignalBook()
+    def stock_recommendation(i):
+        signals.sync(fixtures.history, universe)
+        signals.recommendations(universe)
+    screener = Screener(fixtures.history)
+    def screen(i):
+        screener.run(universe)
+    # Warm the price series and history so the cases measure steady state, not generation
+    fixtures.quotes.get_prices(fixtures.whale)
+    stock_recommendation(0)
+    cases = [
+        ("login", login, iterations),
+        ("buy_stock", buy, iterations),
+        ("sell_stock", sell, iterations),
+        ("calculate_portfolio", calculate_portfolio, max(iterations // 100, 5)),
+        ("sip_investment", sip_investment, iterations),
+        ("stock_recommendation", stock_recommendation, max(iterations // 100, 5)),
+        ("screen", screen, max(iterations // 200, 3)),
+    ]
+    results = {}
+    for name, fn, count in cases:
+        if only and name not in only:
+            continue
+        results[name] = measure(fn, count, memory_iterations=min(count, 20))
+    return results
+def compare(results, baseline, tolerance=0.25):
+    # A case regresses if its p50, p95 or peak memory is more than `tolerance` above the baseline
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_kb"):
+            if base[metric] > 0 and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {result[metric]:.2f} vs baseline {base[metric]:.2f}")
+    return regressions
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GrowX operations against a synthetic market.")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--positions", type=int, default=10_000, help="positions in the large portfolio")
+    parser.add_argument("--universe", type=int, default=1000, help="tickers with price history")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--quick", action="store_true", help="a tenth of the fixture sizes and iterations")
+    parser.add_argument("--only", nargs="+", help="run only these cases")
+    parser.add_argument("--fsync", action="store_true", help="fsync the ledger as in production")
+    parser.add_argument("--baseline", help="baseline JSON to compare against; exits 1 on regression")
+    parser.add_argument("--save-baseline", help="write the results here as a new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.users, args.positions, args.universe, args.iterations = (
+            args.users // 10, args.positions // 10, args.universe // 10, args.iterations // 10
+        )
+    with tempfile.TemporaryDirectory(prefix="growx-bench-") as root:
+        started = time.perf_counter()
+        fixtures = Fixtures(root, args.users, args.positions, args.universe, fsync=args.fsync)
+        print(f"Fixtures: {args.users} users, {args.positions}-position portfolio, {args.universe} tickers "
+              f"({time.perf_counter() - started:.1f}s)")
+        try:
+            results = run_benchmarks(fixtures, args.iterations, args.only)
+        finally:
+            fixtures.close()
+    print(f"{'case':<22} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak KB':>10}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['ops_per_s']:>10.1f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f} {r['peak_kb']:>10.1f}")
+    report = {"config": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+if __name__ == "__main__":
+    main()
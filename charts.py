@@ -0,0 +1,144 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from metrics import registry, timed
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and, from each
+    # bucket in between, the point forming the largest triangle with the point kept
+    # before it and the average of the next bucket. Returns the kept indices.
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+class ChartRenderer:
+    # Renders price charts off-screen with the Agg canvas (no pyplot, no display),
+    # downsampled to about one point per horizontal pixel. Rendered images are
+    # cached by (ticker, period, last bar timestamp, format, size), so a chart is
+    # redrawn only when a new bar arrives.
+    def __init__(self, store, width=800, height=500, dpi=100, max_entries=256):
+        self.store = store
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    def _figure(self):
+        # matplotlib is only imported once something is actually drawn
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=(self.width / self.dpi, self.height / self.dpi), dpi=self.dpi)
+        FigureCanvasAgg(figure)
+        return figure
+    def _draw(self, figure, ticker, period, bars):
+        figure.clear()
+        axes = figure.add_subplot()
+        kept = lttb(bars["ts"], bars["Close"], self.width)
+        axes.plot(bars["ts"][kept].astype("datetime64[ns]"), bars["Close"][kept])
+        axes.set_title(f"{ticker} Stock Price - {period}")
+        axes.set_xlabel("Date")
+        axes.set_ylabel("Price ($)")
+        axes.grid(True)
+        figure.autofmt_xdate()
+        figure.tight_layout()
+    def _save(self, figure, fmt):
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    def _cached(self, key):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return image
+    def _remember(self, key, image):
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = image
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+    @timed("growx_chart_render")
+    def render_many(self, tickers, period="1y", fmt="png"):
+        # One figure is drawn and cleared for every chart that isn't cached
+        images = {}
+        errors = {}
+        figure = None
+        for ticker in dict.fromkeys(t.upper() for t in tickers):
+            try:
+                bars = self.store.window(ticker, period)
+            except Exception as e:
+                errors[ticker] = e
+                continue
+            if not len(bars):
+                errors[ticker] = LookupError(f"No data available for {ticker} for the selected period.")
+                continue
+            key = (ticker, period, int(bars["ts"][-1]), fmt, self.width, self.height)
+            image = self._cached(key)
+            if image is None:
+                if figure is None:
+                    figure = self._figure()
+                self._draw(figure, ticker, period, bars)
+                image = self._save(figure, fmt)
+                self._remember(key, image)
+            images[ticker] = image
+        return images, errors
+    def render(self, ticker, period="1y", fmt="png"):
+        images, errors = self.render_many([ticker], period, fmt)
+        if errors:
+            raise next(iter(errors.values()))
+        return images[ticker.upper()]
+    def save_many(self, tickers, directory, period="1y", fmt="png"):
+        # Ticker, period and format make up the file name, so none may hold a path separator
+        for part in (period, fmt):
+            if os.path.basename(part) != part:
+                raise ValueError(f"Invalid chart file name part: {part!r}")
+        os.makedirs(directory, exist_ok=True)
+        images, errors = self.render_many(tickers, period, fmt)
+        paths = {}
+        for ticker, image in images.items():
+            if os.path.basename(ticker) != ticker:
+                errors[ticker] = ValueError(f"Invalid ticker: {ticker!r}")
+                continue
+            paths[ticker] = os.path.join(directory, f"{ticker}-{period}.{fmt}")
+            with open(paths[ticker], "wb") as f:
+                f.write(image)
+        return paths, errors
+    def save(self, ticker, directory, period="1y", fmt="png"):
+        paths, errors = self.save_many([ticker], directory, period, fmt)
+        if errors:
+            raise next(iter(errors.values()))
+        return paths[ticker.upper()]
+    def render_allocation(self, labels, values, title, fmt="png"):
+        figure = self._figure()
+        axes = figure.add_subplot()
+        axes.pie(values, labels=labels, autopct="%1.1f%%", startangle=140)
+        axes.set_title(title)
+        axes.axis("equal")
+        return self._save(figure, fmt)
+_default_renderer = None
+def default_chart_renderer(store):
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = ChartRenderer(store)
+        registry.track_cache("charts", _default_renderer)
+    return _default_renderer
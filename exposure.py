@@ -0,0 +1,226 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import time
+import numpy as np
+from GrowX import sectors
+from positions import ticker_index
+from settings import data_dir
+from storage import AccountStore
+ACCOUNT_COLUMNS = (
+    ("as_of", "str"), ("user_id", "int"), ("name", "str"), ("balance", "float"), ("positions", "int"),
+    ("investment", "float"), ("market_value", "float"), ("unrealized_pnl", "float"), ("total_value", "float"), ("unpriced", "int"),
+)
+POSITION_COLUMNS = (
+    ("as_of", "str"), ("user_id", "int"), ("ticker", "str"), ("quantity", "float"), ("avg_price", "float"),
+    ("investment", "float"), ("price", "float"), ("market_value", "float"),
+)
+TICKER_COLUMNS = (
+    ("as_of", "str"), ("ticker", "str"), ("sector", "str"), ("holders", "int"), ("shares", "float"),
+    ("investment", "float"), ("price", "float"), ("market_value", "float"), ("weight", "float"),
+)
+SECTOR_COLUMNS = (
+    ("as_of", "str"), ("sector", "str"), ("tickers", "int"), ("holders", "int"), ("market_value", "float"), ("weight", "float"),
+)
+def sector_map(sectors=sectors):
+    # ticker -> sector; a ticker listed under several sectors keeps the first
+    tickers = {}
+    for sector, weights in sectors.items():
+        for ticker in weights:
+            tickers.setdefault(ticker, sector)
+    return tickers
+def _nan_to_none(value):
+    return None if value != value else value
+class CsvTable:
+    def __init__(self, path, columns):
+        self.path = path
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+        self.rows = 0
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self.rows += len(rows)
+    def close(self):
+        self._file.close()
+class ParquetTable:
+    # One row group per write(); pyarrow is imported on first use
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = {"str": pa.string(), "int": pa.int64(), "float": pa.float64()}
+        self.path = path
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self._pa = pa
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self.rows = 0
+    def write(self, rows):
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema
+        ))
+        self.rows += len(rows)
+    def close(self):
+        self._writer.close()
+def resolve_format(format):
+    # "auto" is Parquet when pyarrow is installed, CSV otherwise
+    if format != "auto":
+        return format
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return "csv"
+    return "parquet"
+def open_table(directory, name, columns, format):
+    path = os.path.join(directory, f"{name}.{format}")
+    return ParquetTable(path, columns) if format == "parquet" else CsvTable(path, columns)
+class ExposureJob:
+    # Firm-wide exposure from one pass over every account. Prices for every held
+    # ticker are fetched once into a quote vector indexed by ticker id; accounts
+    # are then read `chunk_size` at a time, valued with array operations and
+    # written out before the next chunk is read, so memory depends on the chunk
+    # size and the number of tickers, not the number of accounts. Per-ticker
+    # totals accumulate into arrays with np.bincount.
+    def __init__(self, quotes, accounts, sectors=sectors, index=ticker_index, chunk_size=10000):
+        self.quotes = quotes
+        self.accounts = accounts
+        self.sectors = sector_map(sectors)
+        self.index = index
+        self.chunk_size = chunk_size
+    def price_vector(self):
+        tickers = self.accounts.held_tickers()
+        for ticker in tickers:
+            self.index.id(ticker)
+        prices, errors = self.quotes.get_prices(tickers)
+        return self.index.quote_vector(prices), errors
+    def run(self, directory, format="auto", positions=False, as_of=None):
+        started = time.perf_counter()
+        format = resolve_format(format)
+        as_of = as_of or datetime.date.today().isoformat()
+        os.makedirs(directory, exist_ok=True)
+        quotes, errors = self.price_vector()
+        size = len(quotes)
+        shares = np.zeros(size)
+        investment = np.zeros(size)
+        market_value = np.zeros(size)
+        holders = np.zeros(size, dtype=np.int64)
+        summary = {"accounts": 0, "positions": 0, "balance": 0.0}
+        accounts = open_table(directory, "accounts", ACCOUNT_COLUMNS, format)
+        holdings = open_table(directory, "positions", POSITION_COLUMNS, format) if positions else None
+        try:
+            for chunk in self.accounts.portfolios(self.chunk_size):
+                rows = [(owner, self.index.id(ticker), quantity, avg_price, cost)
+                        for owner, (_, _, _, held) in enumerate(chunk)
+                        for ticker, quantity, avg_price, cost in held]
+                if rows:
+                    owner, ids, quantity, avg_price, cost = (np.array(column) for column in zip(*rows))
+                    ids = ids.astype(np.int64)
+                else:
+                    owner = ids = np.empty(0, dtype=np.int64)
+                    quantity = avg_price = cost = np.empty(0)
+                if len(self.index.tickers) > size:
+                    # A trade since the prices were fetched added a ticker; it stays unpriced
+                    grow = len(self.index.tickers) - size
+                    quotes = np.concatenate((quotes, np.full(grow, np.nan)))
+                    shares, investment, market_value = (np.concatenate((a, np.zeros(grow))) for a in (shares, investment, market_value))
+                    holders = np.concatenate((holders, np.zeros(grow, dtype=np.int64)))
+                    size = len(quotes)
+                price = quotes[ids]
+                value = quantity * price
+                priced = ~np.isnan(value)
+                n = len(chunk)
+                account_value = np.bincount(owner, weights=np.where(priced, value, 0.0), minlength=n)
+                account_cost = np.bincount(owner, weights=cost, minlength=n)
+                # P&L only over positions with a price, or an unpriced ticker reads as a total loss
+                priced_cost = np.bincount(owner, weights=np.where(priced, cost, 0.0), minlength=n)
+                unpriced = np.bincount(owner[~priced], minlength=n)
+                counts = np.bincount(owner, minlength=n)
+                shares += np.bincount(ids, weights=quantity, minlength=size)
+                investment += np.bincount(ids, weights=cost, minlength=size)
+                market_value += np.bincount(ids[priced], weights=value[priced], minlength=size)
+                holders += np.bincount(ids, minlength=size)
+                accounts.write([
+                    (as_of, user_id, name, balance, int(counts[i]), float(account_cost[i]), float(account_value[i]),
+                     float(account_value[i] - priced_cost[i]), balance + float(account_value[i]), int(unpriced[i]))
+                    for i, (user_id, name, balance, _) in enumerate(chunk)
+                ])
+                if holdings is not None:
+                    user_ids = [row[0] for row in chunk]
+                    holdings.write([
+                        (as_of, user_ids[o], self.index.tickers[t], q, a, c, _nan_to_none(p), _nan_to_none(v))
+                        for o, t, q, a, c, p, v in zip(owner.tolist(), ids.tolist(), quantity.tolist(), avg_price.tolist(),
+                                                       cost.tolist(), price.tolist(), value.tolist())
+                    ])
+                summary["accounts"] += n
+                summary["positions"] += len(rows)
+                summary["balance"] += sum(row[2] for row in chunk)
+        finally:
+            accounts.close()
+            if holdings is not None:
+                holdings.close()
+        summary.update(self._write_totals(directory, format, as_of, quotes, shares, investment, market_value, holders))
+        summary.update({
+            "as_of": as_of,
+            "format": format,
+            "directory": directory,
+            "unpriced_tickers": sorted(errors),
+            "elapsed_s": time.perf_counter() - started,
+        })
+        return summary
+    def _write_totals(self, directory, format, as_of, quotes, shares, investment, market_value, holders):
+        total = float(market_value.sum())
+        held = np.flatnonzero(holders)
+        ticker_rows = []
+        by_sector = {}
+        for ticker_id in held[np.argsort(-market_value[held], kind="stable")].tolist():
+            ticker = self.index.tickers[ticker_id]
+            sector = self.sectors.get(ticker, "Other")
+            value = float(market_value[ticker_id])
+            ticker_rows.append((as_of, ticker, sector, int(holders[ticker_id]), float(shares[ticker_id]), float(investment[ticker_id]),
+                                _nan_to_none(float(quotes[ticker_id])), value, value / total if total else 0.0))
+            entry = by_sector.setdefault(sector, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += int(holders[ticker_id])
+            entry[2] += value
+        sector_rows = [
+            (as_of, sector, count, holder_count, value, value / total if total else 0.0)
+            for sector, (count, holder_count, value) in sorted(by_sector.items(), key=lambda item: -item[1][2])
+        ]
+        for name, columns, rows in (("tickers", TICKER_COLUMNS, ticker_rows), ("sectors", SECTOR_COLUMNS, sector_rows)):
+            table = open_table(directory, name, columns, format)
+            try:
+                table.write(rows)
+            finally:
+                table.close()
+        return {
+            "market_value": total,
+            "tickers": len(ticker_rows),
+            "sectors": {sector: {"market_value": value, "weight": weight} for _, sector, _, _, value, weight in sector_rows},
+        }
+def main(argv=None):
+    from quotes import LocalQuoteProvider, default_provider
+    parser = argparse.ArgumentParser(description="Value every account against one set of quotes and export firm-wide exposure.")
+    parser.add_argument("-o", "--output", help="directory for the exported tables (default: <data dir>/exposure/<date>)")
+    parser.add_argument("--format", choices=("auto", "csv", "parquet"), default="auto", help="auto is Parquet when pyarrow is installed")
+    parser.add_argument("--positions", action="store_true", help="also export every position")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--offline", action="store_true", help="use deterministic local prices")
+    parser.add_argument("--data-dir", help="directory for accounts")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    as_of = datetime.date.today().isoformat()
+    directory = args.output or os.path.join(data_dir(), "exposure", as_of)
+    accounts = AccountStore()
+    try:
+        job = ExposureJob(LocalQuoteProvider() if args.offline else default_provider(), accounts, chunk_size=args.chunk_size)
+        summary = job.run(directory, args.format, args.positions, as_of)
+    finally:
+        accounts.close()
+    print(json.dumps(summary, indent=2))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import registry
+from quotes import LocalQuoteProvider, QuoteNotFound, QuoteProvider, unique_tickers
+class RateLimited(RuntimeError):
+    # Upstream said 429 Too Many Requests; retry_after is in seconds when the server sent one
+    def __init__(self, message="429 Too Many Requests", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+def is_throttled(error):
+    # yfinance raises YFRateLimitError; other clients only say it in the message
+    if isinstance(error, RateLimited) or type(error).__name__ == "YFRateLimitError":
+        return True
+    text = str(error)
+    return "429" in text or "Too Many Requests" in text or "Rate limit" in text
+class TokenBucket:
+    # `rate` tokens a second, at most `burst` saved up; acquire() blocks until one is free
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+    def penalize(self, seconds):
+        # After a 429 the whole bucket backs off, not just the call that saw it
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+class _Flight:
+    __slots__ = ("done", "result", "error")
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+class SingleFlight:
+    # Concurrent callers for one key share a single call: the first caller owns the
+    # flight and runs it, everyone arriving before it lands waits for its result
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+    def __len__(self):
+        return len(self._flights)
+    def claim(self, key):
+        # (flight, True) if the caller must run it and then land() it
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+    def land(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = error
+        flight.done.set()
+    def do(self, key, fn):
+        flight, owner = self.claim(key)
+        if not owner:
+            registry.inc("growx_fetch_coalesced_total", call=key[0])
+            return flight.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.land(key, flight, error=e)
+            raise
+        self.land(key, flight, result)
+        return result
+class ScheduledQuoteProvider(QuoteProvider):
+    # Sits in front of the upstream provider (under any cache): identical concurrent
+    # requests coalesce into one call, calls pass a token bucket and a concurrency
+    # limit, and throttled or failed calls retry with full-jitter exponential backoff.
+    # QuoteNotFound is an answer, not a failure, and is never retried.
+    def __init__(self, provider, rate=5.0, burst=10, max_concurrency=4, retries=4, backoff=0.5, max_backoff=30.0, seed=None):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self._gather = threading.Lock()
+        self.flights = SingleFlight()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.upstream_calls = 0
+        self.retried = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    def _delay(self, attempt, error):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            return retry_after + self._rng.uniform(0, self.backoff)
+        return self._rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+    def _take(self, slots):
+        if slots == 1:
+            self.slots.acquire()
+            return
+        # One multi-slot taker at a time, or two batches could each hold half the slots
+        with self._gather:
+            for _ in range(slots):
+                self.slots.acquire()
+    def _upstream(self, call, fn, *args, cost=1, slots=1):
+        # One upstream request under the rate limit and concurrency cap, retried on
+        # failure. A batch is charged `cost` tokens and holds `slots` of the cap.
+        attempt = 0
+        while True:
+            for _ in range(cost):
+                self.bucket.acquire()
+            self._take(slots)
+            try:
+                with self._lock:
+                    self.upstream_calls += 1
+                try:
+                    return fn(*args)
+                except QuoteNotFound:
+                    raise
+                except Exception as e:
+                    error = e
+            finally:
+                for _ in range(slots):
+                    self.slots.release()
+            throttled = is_throttled(error)
+            if throttled:
+                with self._lock:
+                    self.throttled += 1
+                registry.inc("growx_fetch_throttled_total", call=call)
+            if attempt >= self.retries:
+                raise error
+            delay = self._delay(attempt, error)
+            if throttled:
+                self.bucket.penalize(delay)
+            with self._lock:
+                self.retried += 1
+            registry.inc("growx_fetch_retries_total", call=call)
+            time.sleep(delay)
+            attempt += 1
+    def get_price(self, ticker):
+        ticker = ticker.upper()
+        return self.flights.do(("price", ticker), lambda: self._upstream("price", self.provider.get_price, ticker))
+    def get_prices(self, tickers, max_workers=8):
+        # Tickers already in flight are joined; the rest go upstream as one batch,
+        # charged a token per ticker and downloading on no more threads than the
+        # concurrency cap, with a slot held for each. A batch answers a failed ticker,
+        # 429 included, with an empty column, so every ticker it didn't price is asked
+        # for again on its own, where the real error comes back and is retried.
+        owned = {}
+        joined = {}
+        for ticker in unique_tickers(tickers):
+            flight, owner = self.flights.claim(("price", ticker))
+            (owned if owner else joined)[ticker] = flight
+        if joined:
+            registry.inc("growx_fetch_coalesced_total", value=len(joined), call="price")
+        prices = {}
+        errors = {}
+        pending = list(owned)
+        try:
+            if pending:
+                threads = min(max_workers, self.max_concurrency, len(pending))
+                try:
+                    fetched, _ = self._upstream("prices", self.provider.get_prices, pending, threads, cost=len(pending), slots=threads)
+                    prices.update(fetched)
+                except Exception:
+                    # _upstream has already retried the whole batch; fall back to single lookups
+                    pass
+                missing = [ticker for ticker in pending if ticker not in prices]
+                if missing:
+                    # Straight to _upstream: get_price would wait on the flights this call owns
+                    with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(missing))) as pool:
+                        futures = {pool.submit(self._upstream, "price", self.provider.get_price, ticker): ticker for ticker in missing}
+                        for future in as_completed(futures):
+                            try:
+                                prices[futures[future]] = future.result()
+                            except Exception as e:
+                                errors[futures[future]] = e
+        finally:
+            for ticker, flight in owned.items():
+                error = errors.get(ticker)
+                if ticker not in prices and error is None:
+                    error = QuoteNotFound(f"Could not find data for ticker: {ticker}")
+                self.flights.land(("price", ticker), flight, prices.get(ticker), error)
+        for ticker, flight in joined.items():
+            try:
+                prices[ticker] = flight.wait()
+            except Exception as e:
+                errors[ticker] = e
+        return prices, errors
+    def get_history(self, ticker, period="1y", start=None):
+        ticker = ticker.upper()
+        return self.flights.do(("history", ticker, period, start), lambda: self._upstream("history", self.provider.get_history, ticker, period, start))
+    def stats(self):
+        return {"upstream_calls": self.upstream_calls, "retried": self.retried, "throttled": self.throttled, "in_flight": len(self.flights)}
+class FakeQuoteProvider(QuoteProvider):
+    # Local prices behind a simulated network: every call sleeps `latency` seconds
+    # (plus up to `jitter`), and answers 429 when more than `limit` calls arrive
+    # within a second, or at random with probability `throttle_rate`
+    def __init__(self, provider=None, latency=0.05, jitter=0.02, limit=None, throttle_rate=0.0, retry_after=None, seed=None):
+        self.provider = provider or LocalQuoteProvider()
+        self.latency = latency
+        self.jitter = jitter
+        self.limit = limit
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.calls = 0
+        self.rejected = 0
+        self.concurrent = 0
+        self.peak_concurrent = 0
+        self._recent = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+    def _call(self, fn, *args):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if t > now - 1.0]
+            self._recent.append(now)
+            throttled = (self.limit is not None and len(self._recent) > self.limit) or self._rng.random() < self.throttle_rate
+            if throttled:
+                self.rejected += 1
+            self.concurrent += 1
+            self.peak_concurrent = max(self.peak_concurrent, self.concurrent)
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        try:
+            time.sleep(delay)
+            if throttled:
+                raise RateLimited(retry_after=self.retry_after)
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+    def get_price(self, ticker):
+        return self._call(self.provider.get_price, ticker)
+    def get_prices(self, tickers, max_workers=8):
+        return self._call(self.provider.get_prices, tickers, max_workers)
+    def get_history(self, ticker, period="1y", start=None):
+        return self._call(self.provider.get_history, ticker, period, start)
+def simulate(provider, tickers, requests=1000, clients=32, seed=0):
+    # `clients` threads fire `requests` single-ticker lookups drawn from a small hot set
+    rng = random.Random(seed)
+    picks = [rng.choice(tickers) for _ in range(requests)]
+    errors = []
+    def request(ticker):
+        try:
+            provider.get_price(ticker)
+        except Exception as e:
+            errors.append(type(e).__name__)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(request, picks))
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "elapsed_s": elapsed, "errors": len(errors), "error_types": sorted(set(errors))}
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the fetch scheduler against a fake provider with latency and 429s.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--tickers", nargs="+", default=["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "JPM"])
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--limit", type=int, default=20, help="fake upstream calls allowed per second before 429s")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="fraction of calls answered 429 at random")
+    parser.add_argument("--rate", type=float, default=15.0, help="scheduler tokens per second")
+    parser.add_argument("--burst", type=int, default=15)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--unscheduled", action="store_true", help="call the fake provider directly, for comparison")
+    args = parser.parse_args(argv)
+    fake = FakeQuoteProvider(LocalQuoteProvider(args.tickers), args.latency, limit=args.limit, throttle_rate=args.throttle_rate, seed=0)
+    provider = fake if args.unscheduled else ScheduledQuoteProvider(fake, args.rate, args.burst, args.concurrency, seed=0)
+    result = simulate(provider, args.tickers, args.requests, args.clients)
+    result.update({"upstream_calls": fake.calls, "upstream_429s": fake.rejected, "peak_upstream_concurrency": fake.peak_concurrent})
+    if not args.unscheduled:
+        result.update({"retried": provider.retried})
+    print(json.dumps(result, indent=2))
+if __name__ == "__main__":
+    main()
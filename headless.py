@@ -0,0 +1,333 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import sys
+import time
+from GrowX import User, sectors
+from quotes import PERIOD_DAYS, LocalQuoteProvider, default_provider, valid_ticker
+from history_store import HistoryStore
+from storage import AccountStore
+from ledger import Ledger
+from trading import TradeError, TradingService
+from positions import ticker_index
+from screener import DEFAULT_UNIVERSE, Screener
+from risk import RiskModel
+from charts import ChartRenderer
+from settings import chart_dir, data_dir
+from symbols import default_symbol_master
+from alerts import AlertEngine
+from streaming import PortfolioStream, ReplaySource
+from metrics import export_on_exit, registry
+from sip_engine import SipEngine
+def _clean(value):
+    # NaN/inf are not valid JSON
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    return value
+def check_arguments(command):
+    # Tickers, periods and chart formats end up in file names under the data dir, so
+    # they are checked before any handler runs. Returns an error message or None.
+    tickers = command.get("tickers")
+    if tickers is not None and not isinstance(tickers, list):
+        return "Tickers must be a list."
+    tickers = list(tickers or [])
+    if "ticker" in command:
+        tickers.append(command["ticker"])
+    if isinstance(command.get("orders"), list):
+        tickers.extend(order["ticker"] for order in command["orders"] if isinstance(order, dict) and "ticker" in order)
+    for ticker in tickers:
+        if not valid_ticker(ticker):
+            return f"Invalid ticker: {ticker!r}"
+    period = command.get("period", "1y")
+    if not isinstance(period, str) or period not in PERIOD_DAYS:
+        return f"Unknown period: {period!r}. Use one of {', '.join(PERIOD_DAYS)}."
+    fmt = command.get("fmt", "png")
+    if not isinstance(fmt, str) or not fmt.isalnum():
+        return f"Unknown chart format: {fmt!r}"
+    return None
+class CommandRunner:
+    # Same operations as the GrowX menu, driven by command dicts instead of input(),
+    # with no sleeps, prints or charts
+    def __init__(self, quotes=None, history=None, accounts=None, ledger=None):
+        self.quotes = quotes or default_provider()
+        self.history = history or HistoryStore(self.quotes)
+        self.accounts = accounts or AccountStore()
+        self.ledger = ledger or Ledger()
+        self.trading = TradingService(self.quotes, self.accounts, self.ledger, User.from_record)
+        self.risk_model = RiskModel(self.history)
+        self.charts = ChartRenderer(self.history)
+        registry.track_cache("charts", self.charts)
+        if hasattr(self.quotes, "hits"):
+            registry.track_cache("quotes", self.quotes)
+        self.symbols = default_symbol_master()
+        self.alerts = AlertEngine.from_rows(self.accounts.alerts())
+        self.users = {}
+        self.handlers = {
+            "signup": self.signup,
+            "login": self.login,
+            "deposit": self.deposit,
+            "withdraw": self.withdraw,
+            "buy": self.buy,
+            "sell": self.sell,
+            "orders": self.orders,
+            "value": self.value,
+            "risk": self.risk,
+            "sip": self.sip,
+            "subscribe": self.subscribe,
+            "run_sips": self.run_sips,
+            "screen": self.screen,
+            "chart": self.chart,
+            "watch": self.watch,
+            "search": self.search,
+            "alert": self.alert,
+            "alerts": self.list_alerts,
+            "cancel_alert": self.cancel_alert,
+            "check_alerts": self.check_alerts,
+            "stream": self.stream,
+            "metrics": self.metrics,
+            "unwatch": self.unwatch,
+        }
+    def user(self, name):
+        if name not in self.users:
+            self.users[name] = self.trading.load_user(name)
+        return self.users[name]
+    def signup(self, name, email, password, phone_number="", deposit=0):
+        if self.accounts.exists(name):
+            raise TradeError("User already exists. Please use a different name or login.")
+        user = User(name, email, password, phone_number)
+        self.accounts.create_user(user)
+        self.users[name] = user
+        if deposit:
+            self.trading.deposit(user, deposit)
+        return {"name": name, "balance": user.balance}
+    def login(self, name, password):
+        record = self.accounts.find_user(name)
+        if record is None:
+            raise TradeError("User not found. Please sign up first.")
+        if not User.from_record(*record).check_password(password):
+            raise TradeError("Incorrect password. Please try again.")
+        return {"name": name, "balance": self.user(name).balance}
+    def deposit(self, user, amount):
+        return self.trading.deposit(self.user(user), amount)
+    def withdraw(self, user, amount):
+        return self.trading.withdraw(self.user(user), amount)
+    def buy(self, user, ticker, quantity, price=None):
+        if self.symbols is not None:
+            self.check_ticker(ticker)
+        return self.trading.buy(self.user(user), ticker, quantity, price)
+    def sell(self, user, ticker, quantity, price=None):
+        return self.trading.sell(self.user(user), ticker, quantity, price)
+    def orders(self, orders):
+        return {"results": self.trading.submit_orders(orders, self.users)}
+    def value(self, user):
+        account = self.user(user)
+        prices, errors = self.quotes.get_prices(account.portfolio)
+        quotes = ticker_index.quote_vector(prices)
+        values = account.portfolio.market_values(quotes)
+        positions = []
+        for (ticker, (quantity, avg_price, investment)), current_value in zip(account.portfolio.items(), values):
+            positions.append({
+                "ticker": ticker,
+                "quantity": quantity,
+                "avg_price": avg_price,
+                "investment": investment,
+                "price": prices.get(ticker),
+                "value": float(current_value),
+            })
+        total_value, total_investment = account.portfolio.totals(quotes)
+        return {
+            "positions": positions,
+            "errors": {ticker: str(e) for ticker, e in errors.items()},
+            "total_value": total_value,
+            "total_investment": total_investment,
+            "cash": account.balance,
+            "account_value": total_value + account.balance,
+        }
+    def risk(self, user):
+        account = self.user(user)
+        prices, errors = self.quotes.get_prices(account.portfolio)
+        values = account.portfolio.market_values(ticker_index.quote_vector(prices))
+        result = self.risk_model.portfolio_risk(dict(zip(account.portfolio.keys(), values)))
+        result["errors"] = {ticker: str(e) for ticker, e in {**errors, **result["errors"]}.items()}
+        return result
+    def sip(self, user, sector, amount):
+        sector = sector.capitalize()
+        if sector not in sectors:
+            raise TradeError("Invalid sector selection.")
+        purchases, errors = self.trading.sip(self.user(user), sectors[sector], amount)
+        return {"purchases": purchases, "errors": {ticker: str(e) for ticker, e in errors.items()}}
+    def subscribe(self, user, sector, amount, start=None):
+        sector = sector.capitalize()
+        if sector not in sectors:
+            raise TradeError("Invalid sector selection.")
+        start = datetime.date.fromisoformat(start) if start else None
+        return {"plan_id": self.trading.subscribe_sip(self.user(user), sector, amount, start)}
+    def run_sips(self, date=None, fractional=False):
+        # Settles straight into the store, so drop cached accounts that may now be stale
+        engine = SipEngine(self.quotes, self.accounts, sectors, self.ledger, fractional=fractional)
+        summary = engine.run_due(datetime.date.fromisoformat(date) if date else None)
+        self.users.clear()
+        return summary
+    def screen(self, tickers=None, short_window=20, long_window=50, period="1y"):
+        screener = Screener(self.history, short_window=short_window, long_window=long_window, period=period)
+        results, errors = screener.run(tickers or DEFAULT_UNIVERSE)
+        return {"results": results, "errors": {ticker: str(e) for ticker, e in errors.items()}}
+    def chart(self, tickers=None, user=None, period="1y", fmt="png", directory=None):
+        # With a user and no tickers, renders that user's whole watchlist
+        if tickers is None:
+            tickers = sorted(self.user(user).watchlist) if user is not None else DEFAULT_UNIVERSE
+        directory = directory or chart_dir() or os.path.join(data_dir(), "charts")
+        paths, errors = self.charts.save_many(tickers, directory, period, fmt)
+        return {"paths": paths, "errors": {ticker: str(e) for ticker, e in errors.items()}}
+    def check_ticker(self, ticker):
+        if self.symbols is not None:
+            if not self.symbols.exists(ticker):
+                raise TradeError(f"Could not find data for ticker: {ticker.upper()}")
+        else:
+            self.quotes.get_price(ticker.upper())
+    def watch(self, user, ticker):
+        self.check_ticker(ticker)
+        account = self.user(user)
+        account.watchlist.add(ticker.upper())
+        self.accounts.add_to_watchlist(account, ticker.upper())
+        return {"watchlist": sorted(account.watchlist)}
+    def search(self, text, limit=10):
+        if self.symbols is None:
+            raise TradeError("No symbol listing available.")
+        return {"matches": [{"symbol": symbol, "name": name} for symbol, name in self.symbols.search(text, limit)]}
+    def alert(self, user, ticker, direction, threshold):
+        account = self.user(user)
+        ticker = ticker.upper()
+        if ticker not in account.watchlist:
+            raise TradeError("Alerts can only be set on stocks in your watchlist.")
+        if direction not in ("above", "below") or threshold <= 0:
+            raise TradeError("Alert needs a direction of above or below and a positive threshold.")
+        alert_id = self.accounts.add_alert(account, ticker, direction, threshold)
+        self.alerts.add(user, ticker, direction, threshold, alert_id)
+        return {"alert_id": alert_id}
+    def list_alerts(self, user):
+        return {"alerts": [
+            {"alert_id": alert_id, "ticker": ticker, "direction": direction, "threshold": threshold}
+            for alert_id, _, ticker, direction, threshold in self.alerts.for_user(user)
+        ]}
+    def cancel_alert(self, user, alert_id):
+        if not self.alerts.cancel(alert_id, user):
+            raise TradeError("Alert not found.")
+        self.accounts.remove_alerts([alert_id])
+        return {"alert_id": alert_id}
+    def check_alerts(self, prices=None):
+        # Prices every ticker with a live alert, unless prices are given
+        errors = {}
+        if prices is None:
+            prices, errors = self.quotes.get_prices(self.alerts.tickers())
+        triggered = self.alerts.on_prices(prices)
+        self.accounts.remove_alerts([alert[0] for alert in triggered])
+        return {
+            "triggered": [
+                {"alert_id": alert_id, "user": user, "ticker": ticker, "direction": direction, "threshold": threshold, "price": prices[ticker]}
+                for alert_id, user, ticker, direction, threshold in triggered
+            ],
+            "errors": {ticker: str(e) for ticker, e in errors.items()},
+        }
+    def stream(self, path, users=None, user=None, speed=None):
+        # Replays a tick file through the given accounts (default: the one user, or every
+        # loaded account), firing alerts as it goes
+        if users is None:
+            users = [user] if user is not None else list(self.users)
+        names = list(users)
+        stream = PortfolioStream(alerts=self.alerts)
+        stream.subscribe_many((name, self.user(name).portfolio) for name in names)
+        triggered = []
+        def on_alert(fired, price):
+            self.accounts.remove_alerts([alert[0] for alert in fired])
+            triggered.extend(
+                {"alert_id": alert_id, "user": user, "ticker": ticker, "direction": direction, "threshold": threshold, "price": price}
+                for alert_id, user, ticker, direction, threshold in fired
+            )
+        summary = stream.run(ReplaySource(path, speed), on_alert)
+        return {**summary, "values": {name: stream.value(name) for name in names}, "triggered": triggered}
+    def metrics(self, format="json"):
+        if format == "prometheus":
+            return {"text": registry.prometheus()}
+        return registry.snapshot()
+    def unwatch(self, user, ticker):
+        account = self.user(user)
+        if ticker.upper() not in account.watchlist:
+            raise TradeError("Stock not found in your watchlist.")
+        account.watchlist.remove(ticker.upper())
+        # Alerts are only allowed on watchlist stocks, so they go with it
+        cancelled = self.alerts.cancel_ticker(user, ticker)
+        self.accounts.remove_from_watchlist(account, ticker.upper())
+        self.accounts.remove_ticker_alerts(account, ticker.upper())
+        return {"watchlist": sorted(account.watchlist), "cancelled_alerts": cancelled}
+    def execute(self, command):
+        op = command.get("op") if isinstance(command, dict) else None
+        started = time.perf_counter()
+        try:
+            if not isinstance(command, dict):
+                # A JSON line that parsed to a number, string or list
+                raise TradeError("Invalid command: expected a JSON object")
+            command = dict(command)
+            command.pop("op", None)
+            if op not in self.handlers:
+                raise TradeError(f"Unknown command: {op}")
+            error = check_arguments(command)
+            if error is not None:
+                raise TradeError(error)
+            result = {"ok": True, "op": op, **self.handlers[op](**command)}
+        except Exception as e:
+            result = {"ok": False, "op": op, "error": str(e)}
+            registry.inc("growx_command_errors_total", op=op, type=type(e).__name__)
+        elapsed = time.perf_counter() - started
+        registry.observe("growx_command_seconds", elapsed, op=op)
+        result["elapsed_ms"] = elapsed * 1000
+        return _clean(result)
+    def run(self, lines):
+        # One JSON command per line; blank lines and # comments are skipped
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                command = json.loads(line)
+            except ValueError as e:
+                yield {"ok": False, "op": None, "error": f"Invalid command: {e}"}
+                continue
+            yield self.execute(command)
+    def close(self):
+        self.ledger.close()
+        self.accounts.close()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run GrowX commands from a JSON lines file or stdin.")
+    parser.add_argument("commands", nargs="?", default="-", help="command file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="where to write JSON results, or - for stdout")
+    parser.add_argument("--data-dir", help="directory for accounts, ledger and price history")
+    parser.add_argument("--offline", action="store_true", help="use deterministic local prices instead of Yahoo Finance")
+    parser.add_argument("--no-fsync", action="store_true", help="don't fsync the ledger (load testing only)")
+    parser.add_argument("--metrics", help="record metrics and write them here on exit (.json, or Prometheus text)")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        export_on_exit(args.metrics)
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    quotes = LocalQuoteProvider() if args.offline else None
+    runner = CommandRunner(quotes=quotes, ledger=Ledger(fsync=not args.no_fsync))
+    source = sys.stdin if args.commands == "-" else open(args.commands)
+    sink = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for result in runner.run(source):
+            sink.write(json.dumps(result) + "\n")
+    finally:
+        runner.close()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+if __name__ == "__main__":
+    main()
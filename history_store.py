@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import numpy as np
+from quotes import PERIOD_DAYS, valid_ticker
+from settings import data_dir
+from metrics import timed
+BAR_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+BAR_DTYPE = np.dtype([("ts", "<i8")] + [(field, "<f8") for field in BAR_FIELDS])
+DAY_NS = 86_400 * 1_000_000_000
+class HistoryStore:
+    # Daily OHLCV bars kept on disk as one fixed-width record file per ticker.
+    # New bars are appended and files are read back through np.memmap, so
+    # reopening a ticker costs no parsing or copying.
+    def __init__(self, provider, root=None, refresh_interval=3600, backfill_period="10y"):
+        self.provider = provider
+        self.root = root or os.path.join(data_dir(), "history")
+        self.refresh_interval = refresh_interval
+        self.backfill_period = backfill_period
+        self._maps = {}
+        self._checked = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+    def _path(self, ticker):
+        if not valid_ticker(ticker):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+        return os.path.join(self.root, f"{ticker.upper()}.bars")
+    def bars(self, ticker):
+        path = self._path(ticker)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // BAR_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        cached = self._maps.get(ticker.upper())
+        if cached is not None and len(cached) == count:
+            return cached
+        bars = np.memmap(path, dtype=BAR_DTYPE, mode="r", shape=(count,))
+        self._maps[ticker.upper()] = bars
+        return bars
+    def _ticker_lock(self, ticker):
+        # One lock per ticker, so a slow fetch only holds up callers of that ticker
+        with self._lock:
+            lock = self._locks.get(ticker)
+            if lock is None:
+                lock = self._locks[ticker] = threading.Lock()
+            return lock
+    def _to_records(self, hist):
+        import pandas as pd
+        index = pd.DatetimeIndex(hist.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        records = np.empty(len(hist), dtype=BAR_DTYPE)
+        records["ts"] = index.normalize().as_unit("ns").asi8
+        for field in BAR_FIELDS:
+            records[field] = hist[field].to_numpy(dtype=float) if field in hist else np.nan
+        return records
+    @timed("growx_history_refresh")
+    def refresh(self, ticker, force=False):
+        ticker = ticker.upper()
+        with self._ticker_lock(ticker):
+            checked = self._checked.get(ticker)
+            if not force and checked is not None and time.monotonic() - checked < self.refresh_interval:
+                return
+            bars = self.bars(ticker)
+            if len(bars):
+                # Re-fetch from the last stored day so a still-forming bar gets replaced
+                last_ts = int(bars["ts"][-1])
+                hist = self.provider.get_history(ticker, start=np.datetime64(last_ts, "ns").astype("datetime64[D]").item())
+            else:
+                last_ts = None
+                hist = self.provider.get_history(ticker, self.backfill_period)
+            self._checked[ticker] = time.monotonic()
+            if hist is None or hist.empty:
+                return
+            records = self._to_records(hist)
+            offset = len(bars)
+            if last_ts is not None:
+                records = records[records["ts"] >= last_ts]
+                if len(records) and records["ts"][0] == last_ts:
+                    # Overwrite the last record in place; the file never shrinks, so
+                    # existing memory maps of it stay valid
+                    offset -= 1
+            if len(records):
+                self._maps.pop(ticker, None)
+                with open(self._path(ticker), "r+b" if last_ts is not None else "wb") as f:
+                    f.seek(offset * BAR_DTYPE.itemsize)
+                    f.write(records.tobytes())
+    def window(self, ticker, period="1y"):
+        self.refresh(ticker)
+        bars = self.bars(ticker)
+        if len(bars) == 0 or period not in PERIOD_DAYS:
+            return bars
+        cutoff = bars["ts"][-1] - PERIOD_DAYS[period] * DAY_NS
+        return bars[np.searchsorted(bars["ts"], cutoff, side="right"):]
+    def closes(self, ticker, period="1y"):
+        bars = self.window(ticker, period)
+        return bars["ts"], bars["Close"]
+    def get_history(self, ticker, period="1y"):
+        import pandas as pd
+        bars = self.window(ticker, period)
+        return pd.DataFrame(
+            {field: bars[field] for field in BAR_FIELDS},
+            index=pd.DatetimeIndex(bars["ts"].astype("datetime64[ns]"), name="Date"),
+        )
+_default_store = None
+def default_history_store(provider):
+    global _default_store
+    if _default_store is None:
+        _default_store = HistoryStore(provider)
+    return _default_store
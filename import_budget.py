@@ -0,0 +1,43 @@
+import argparse
+import json
+import subprocess
+import sys
+# Modules that must not be loaded just by importing an entry point
+HEAVY = ("yfinance", "pandas", "matplotlib")
+# Cumulative import time allowed per entry point, in milliseconds
+BUDGETS_MS = {
+    "GrowX": 300,
+    "headless": 400,
+    "server": 450,
+    "sip_engine": 300,
+}
+def measure(module):
+    # A fresh interpreter each time, so nothing is already imported
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    elapsed_us = 0
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            elapsed_us = int(parts[1])
+    return elapsed_us / 1000, json.loads(result.stdout)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail if an entry point imports too slowly or loads a heavy dependency.")
+    parser.add_argument("modules", nargs="*", help="entry points to check (default: all with a budget)")
+    parser.add_argument("--runs", type=int, default=3, help="take the fastest of this many runs")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget, e.g. on slow CI machines")
+    args = parser.parse_args(argv)
+    failed = False
+    for module in args.modules or BUDGETS_MS:
+        results = [measure(module) for _ in range(args.runs)]
+        elapsed = min(ms for ms, _ in results)
+        heavy = results[0][1]
+        budget = BUDGETS_MS.get(module, 300) * args.scale
+        ok = elapsed <= budget and not heavy
+        failed |= not ok
+        status = "ok" if ok else "FAIL"
+        note = f" (loaded {', '.join(heavy)})" if heavy else ""
+        print(f"{status:<5} {module:<12} {elapsed:8.1f} ms / {budget:.0f} ms{note}")
+    sys.exit(1 if failed else 0)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+from metrics import timed
+class RollingSMA:
+    # Ring buffer plus running sum: each update is O(1) regardless of the window
+    def __init__(self, window):
+        self.window = window
+        self._buffer = [0.0] * window
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+        self._updates = 0
+    def update(self, value, replace=False):
+        if replace and self._count:
+            last = (self._index - 1) % self.window
+            self._sum += value - self._buffer[last]
+            self._buffer[last] = value
+            return self.value
+        if self._count == self.window:
+            self._sum -= self._buffer[self._index]
+        else:
+            self._count += 1
+        self._buffer[self._index] = value
+        self._sum += value
+        self._index = (self._index + 1) % self.window
+        self._updates += 1
+        if self._updates % (self.window * 64) == 0:
+            # Re-sum occasionally so floating point drift can't accumulate
+            self._sum = sum(self._buffer[:self._count])
+        return self.value
+    @property
+    def value(self):
+        if self._count < self.window:
+            return None
+        return self._sum / self.window
+class RollingEMA:
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+        self._previous = None
+    def update(self, value, replace=False):
+        if not replace:
+            self._previous = self.value
+        if self._previous is None:
+            self.value = value
+        else:
+            self.value = self._previous + self.alpha * (value - self._previous)
+        return self.value
+class CrossoverSignal:
+    def __init__(self, short_window=20, long_window=50):
+        self.short = RollingSMA(short_window)
+        self.long = RollingSMA(long_window)
+        self.short_ema = RollingEMA(short_window)
+        self.long_ema = RollingEMA(long_window)
+        self.price = None
+        self.signal = "Neutral"
+        self.crossed_up = False
+        self.crossed_down = False
+        self._prior_signal = "Neutral"
+    def update(self, price, replace=False):
+        # replace=True revises the current bar instead of starting a new one
+        if not replace:
+            self._prior_signal = self.signal
+        self.price = price
+        short = self.short.update(price, replace)
+        long = self.long.update(price, replace)
+        self.short_ema.update(price, replace)
+        self.long_ema.update(price, replace)
+        if short is None or long is None or short == long:
+            self.signal = "Neutral"
+        elif short > long:
+            self.signal = "Strong Buy"
+        else:
+            self.signal = "Avoid"
+        self.crossed_up = self.signal == "Strong Buy" and self._prior_signal != "Strong Buy"
+        self.crossed_down = self.signal == "Avoid" and self._prior_signal != "Avoid"
+        return self.signal
+class SignalBook:
+    # Live crossover state per ticker, fed bar by bar
+    def __init__(self, short_window=20, long_window=50):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.trackers = {}
+        self.last_ts = {}
+    def on_bar(self, ticker, ts, close):
+        tracker = self.trackers.get(ticker)
+        if tracker is None:
+            tracker = self.trackers[ticker] = CrossoverSignal(self.short_window, self.long_window)
+        last = self.last_ts.get(ticker)
+        if last is not None and ts < last:
+            return tracker
+        tracker.update(close, replace=ts == last)
+        self.last_ts[ticker] = ts
+        return tracker
+    @timed("growx_indicators", call="signal_sync")
+    def sync(self, store, tickers, period="1y"):
+        # Seeds unseen tickers from stored history, then feeds only bars newer than the last one seen
+        errors = {}
+        for ticker in tickers:
+            try:
+                bars = store.window(ticker, period)
+                last = self.last_ts.get(ticker)
+                start = 0 if last is None else int(bars["ts"].searchsorted(last))
+                for ts, close in zip(bars["ts"][start:].tolist(), bars["Close"][start:].tolist()):
+                    self.on_bar(ticker, ts, close)
+            except Exception as e:
+                errors[ticker] = e
+        return errors
+    def recommendations(self, tickers):
+        return [(ticker, self.trackers[ticker].price, self.trackers[ticker].signal) for ticker in tickers if ticker in self.trackers]
+_default_book = None
+def default_signal_book():
+    global _default_book
+    if _default_book is None:
+        _default_book = SignalBook()
+    return _default_book
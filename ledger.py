@@ -0,0 +1,319 @@
+import json
+import os
+import sys
+import threading
+import time
+from settings import data_dir
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+class _Batch:
+    def __init__(self, entries):
+        self.entries = entries
+        self.error = None
+        self.done = threading.Event()
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+def make_entry(name, kind, ticker=None, quantity=0, price=0, amount=0, delta=None):
+    # Entries carry changes, not the state after them: `amount` is the cash moved and
+    # `delta` the (shares, cost) added to the position, as the account store applies
+    # them. Writers that can't see each other's changes still replay to the right total.
+    entry = {
+        "ts": time.time(),
+        "user": name,
+        "kind": kind,
+        "ticker": ticker,
+        "quantity": quantity,
+        "price": price,
+        "amount": amount,
+    }
+    if delta is not None:
+        entry["delta"] = list(delta)
+    return entry
+def ledger_entry(user, kind, ticker=None, quantity=0, price=0, amount=0, delta=None):
+    return make_entry(user.name, kind, ticker, quantity, price, amount, delta)
+def reversals(entries):
+    # Entries undoing `entries`, for changes the ledger recorded but the store never applied
+    return [
+        make_entry(entry["user"], "reversal", entry["ticker"], entry["quantity"], entry["price"], -entry["amount"],
+                   [-part for part in entry["delta"]] if "delta" in entry else None)
+        for entry in entries
+    ]
+def apply_entry(state, entry):
+    account = state.setdefault(entry["user"], {"balance": 0.0, "positions": {}})
+    if "balance" in entry:
+        # Written before entries carried deltas: the state after the change
+        account["balance"] = entry["balance"]
+        if entry.get("ticker") is not None:
+            if entry["position"] is None:
+                account["positions"].pop(entry["ticker"], None)
+            else:
+                account["positions"][entry["ticker"]] = tuple(entry["position"])
+        return
+    account["balance"] += entry["amount"]
+    if "delta" in entry:
+        # Same rule as storage.ADD_POSITION: avg price is investment / quantity, and a
+        # position that reaches zero is removed
+        shares, cost = entry["delta"]
+        quantity, avg_price, investment = account["positions"].get(entry["ticker"], (0, 0.0, 0.0))
+        quantity += shares
+        investment += cost
+        if quantity <= 1e-9:
+            account["positions"].pop(entry["ticker"], None)
+        else:
+            account["positions"][entry["ticker"]] = (quantity, investment / quantity, investment)
+class Ledger:
+    # Append-only JSON lines file. A single writer thread drains every batch queued
+    # while the previous fsync was running and makes them durable with one fsync.
+    # Several processes may append to one file (the server, the SIP engine): each
+    # write holds an exclusive lock on path + ".lock", and sequence numbers are
+    # assigned under it, continuing from the file's tail whenever another writer
+    # has appended since.
+    def __init__(self, path=None, fsync=True):
+        # fsync=False only flushes to the OS, for load tests where durability doesn't matter
+        self.path = path or os.path.join(data_dir(), "ledger.jsonl")
+        self.fsync = fsync
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock_file = open(self.path + ".lock", "ab")
+        # Unbuffered, so a failed write can be cut back off without a buffer flushing it later
+        self._file = open(self.path, "ab", buffering=0)
+        self._seq = 0
+        self._end = None
+        self._lock()
+        try:
+            self._catch_up()
+        finally:
+            self._unlock()
+        self._pending = []
+        self._closed = False
+        self._cond = threading.Condition()
+        self.fsyncs = 0
+        self._writer = threading.Thread(target=self._write_loop, name="ledger-writer", daemon=True)
+        self._writer.start()
+    def _lock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+    def _unlock(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    def _catch_up(self):
+        # Under the lock: if the file changed since our last write, another writer
+        # appended (or crashed mid-write), so cut any torn tail and take its last seq
+        if os.fstat(self._file.fileno()).st_size != self._end:
+            self._truncate_torn_tail()
+            self._seq = self._last_seq()
+            self._end = os.fstat(self._file.fileno()).st_size
+    def _truncate_torn_tail(self):
+        # A crash mid-write can leave a partial last line; cut back to the last
+        # newline so the next append doesn't get glued onto it
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                start = max(pos - 65536, 0)
+                f.seek(start)
+                newline = f.read(pos - start).rfind(b"\n")
+                if newline != -1:
+                    pos = start + newline + 1
+                    break
+                pos = start
+            if pos < end:
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+    def _last_seq(self):
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 65536, 0))
+            lines = f.read().splitlines()
+        for line in reversed(lines):
+            try:
+                return json.loads(line)["seq"]
+            except (ValueError, KeyError):
+                continue
+        return 0
+    def append(self, entry, wait=True):
+        return self.append_many([entry], wait)
+    def append_many(self, entries, wait=True):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Ledger is closed.")
+            batch = _Batch(entries)
+            self._pending.append(batch)
+            self._cond.notify()
+        if wait:
+            batch.wait()
+        return batch
+    def flush(self):
+        self.append_many([])
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batches, self._pending = self._pending, []
+            error = None
+            if any(batch.entries for batch in batches):
+                error = self._write(batches)
+            for batch in batches:
+                batch.error = error
+                batch.done.set()
+    def _write(self, batches):
+        self._lock()
+        try:
+            self._catch_up()
+            start, seq = self._end, self._seq
+            try:
+                for batch in batches:
+                    for entry in batch.entries:
+                        self._seq += 1
+                        entry["seq"] = self._seq
+                data = memoryview(b"".join(
+                    json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+                    for batch in batches for entry in batch.entries
+                ))
+                while data:
+                    data = data[self._file.write(data):]
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                    self.fsyncs += 1
+                self._end = os.fstat(self._file.fileno()).st_size
+            except Exception as e:
+                # The batches are reported as failed, so none of them may stay in the file
+                self._seq = seq
+                try:
+                    os.ftruncate(self._file.fileno(), start)
+                except OSError:
+                    self._end = None
+                return e
+        finally:
+            self._unlock()
+        return None
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        self._file.close()
+        self._lock_file.close()
+    def _replay(self, snapshot_path):
+        # (state, last seq, offset just past the last complete line) from the snapshot plus the tail
+        state = {}
+        offset = 0
+        seq = 0
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+            offset = snapshot["offset"]
+            seq = snapshot["seq"]
+            for name, account in snapshot["accounts"].items():
+                positions = {ticker: tuple(position) for ticker, position in account["positions"].items()}
+                state[name] = {"balance": account["balance"], "positions": positions}
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn final write (or one still in progress); it was never acknowledged
+                    break
+                offset += len(line)
+                entry = json.loads(line)
+                if entry["seq"] > seq:
+                    apply_entry(state, entry)
+                    seq = entry["seq"]
+        return state, seq, offset
+    def replay(self, snapshot_path=None):
+        # Rebuilds balances and positions from the snapshot plus the ledger tail
+        self.flush()
+        return self._replay(snapshot_path or self.path + ".snapshot")[0]
+    def snapshot(self, path=None):
+        # Folds the ledger into a new snapshot so later replays start from its end rather
+        # than the start of the file. The snapshot is built from the file itself, so
+        # entries appended meanwhile simply land in the tail after its offset.
+        path = path or self.path + ".snapshot"
+        self.flush()
+        state, seq, offset = self._replay(path)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"seq": seq, "offset": offset, "accounts": state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return {"seq": seq, "offset": offset, "accounts": len(state)}
+def _close(a, b):
+    return abs(a - b) <= 1e-6 * max(1.0, abs(a), abs(b))
+def reconcile(state, accounts):
+    # Differences between the replayed ledger and the account store, one message each
+    problems = []
+    seen = set()
+    for chunk in accounts.portfolios():
+        for _, name, balance, held in chunk:
+            seen.add(name)
+            account = state.get(name, {"balance": 0.0, "positions": {}})
+            if not _close(balance, account["balance"]):
+                problems.append(f"{name}: store balance {balance} vs ledger {account['balance']}")
+            stored = {ticker: (quantity, investment) for ticker, quantity, _, investment in held}
+            for ticker in sorted(stored.keys() | account["positions"].keys()):
+                position = account["positions"].get(ticker)
+                expected = (position[0], position[2]) if position is not None else None
+                actual = stored.get(ticker)
+                if expected is None or actual is None or not (_close(actual[0], expected[0]) and _close(actual[1], expected[1])):
+                    problems.append(f"{name} {ticker}: store {actual} vs ledger {expected} (quantity, investment)")
+    problems.extend(f"{name}: in the ledger but not the store" for name in sorted(state.keys() - seen))
+    return problems
+_default_ledger = None
+def default_ledger():
+    global _default_ledger
+    if _default_ledger is None:
+        _default_ledger = Ledger()
+    return _default_ledger
+def main(argv=None):
+    import argparse
+    from storage import AccountStore
+    parser = argparse.ArgumentParser(description="Snapshot the ledger or check the account store against it.")
+    parser.add_argument("command", choices=("snapshot", "verify"))
+    parser.add_argument("--data-dir", help="directory for accounts and ledger")
+    parser.add_argument("--repair", action="store_true", help="with verify: rewrite store accounts from the ledger (stop other writers first)")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    ledger = Ledger()
+    try:
+        if args.command == "snapshot":
+            print(json.dumps(ledger.snapshot(), indent=2))
+            return
+        accounts = AccountStore()
+        try:
+            state = ledger.replay()
+            problems = reconcile(state, accounts)
+            for problem in problems:
+                print(problem)
+            if problems and args.repair:
+                missing = accounts.overwrite_accounts(state)
+                print(f"Rewrote {len(state) - len(missing)} accounts from the ledger.")
+            elif not problems:
+                print(f"Store matches the ledger for {len(state)} accounts.")
+        finally:
+            accounts.close()
+    finally:
+        ledger.close()
+    if problems and not args.repair:
+        sys.exit(1)
+if __name__ == "__main__":
+    main()
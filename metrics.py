@@ -0,0 +1,163 @@
+import atexit
+import functools
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+# Upper bounds in seconds, from 100 microseconds to 30 seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            yield bound, total
+class _NullTimer:
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+_null_timer = _NullTimer()
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name + "_seconds", time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            self.registry.inc(self.name + "_errors_total", type=exc_type.__name__, **self.labels)
+        return False
+def _key(labels):
+    return tuple(sorted(labels.items()))
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+class Registry:
+    # Counters, timing histograms and cache gauges. Disabled, every timer and
+    # decorator is a single attribute check, so instrumentation can stay in hot paths.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self._observe((name, _key(labels)), seconds)
+    def _observe(self, key, seconds):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+    def timer(self, name, **labels):
+        # with registry.timer("growx_x", op="y"): records growx_x_seconds and growx_x_errors_total
+        return _Timer(self, name, labels) if self.enabled else _null_timer
+    def track_cache(self, name, cache):
+        # cache: any object with hits and misses counters, read at export time
+        self._caches[name] = cache
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+    def _cache_rows(self):
+        for name, cache in self._caches.items():
+            hits, misses = cache.hits, cache.misses
+            yield name, hits, misses, hits / (hits + misses) if hits + misses else 0.0
+    def snapshot(self):
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self._counters.items())]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "buckets": {str(bound): count for bound, count in histogram.cumulative()},
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        caches = [{"cache": name, "hits": hits, "misses": misses, "hit_ratio": ratio} for name, hits, misses, ratio in self._cache_rows()]
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms, "caches": caches}
+    def prometheus(self):
+        lines = []
+        typed = set()
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                declare(name, "counter")
+                lines.append(f"{name}{_label_text(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                declare(name, "histogram")
+                for bound, count in histogram.cumulative():
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {count}")
+                lines.append(f"{name}_sum{_label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_label_text(labels)} {histogram.count}")
+        for name, hits, misses, ratio in self._cache_rows():
+            labels = (("cache", name),)
+            declare("growx_cache_hits_total", "counter")
+            lines.append(f"growx_cache_hits_total{_label_text(labels)} {hits}")
+            declare("growx_cache_misses_total", "counter")
+            lines.append(f"growx_cache_misses_total{_label_text(labels)} {misses}")
+            declare("growx_cache_hit_ratio", "gauge")
+            lines.append(f"growx_cache_hit_ratio{_label_text(labels)} {ratio}")
+        return "\n".join(lines) + "\n"
+    def write(self, path):
+        # .json for a snapshot, anything else for Prometheus text
+        text = json.dumps(self.snapshot(), indent=2) if path.endswith(".json") else self.prometheus()
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+registry = Registry(enabled=os.environ.get("GROWX_METRICS", "") not in ("", "0"))
+def timed(name, **labels):
+    # Decorator form of registry.timer; the series key is built once, not per call
+    key = (name + "_seconds", _key(labels))
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                registry.inc(name + "_errors_total", type=type(e).__name__, **labels)
+                raise
+            finally:
+                registry._observe(key, time.perf_counter() - started)
+        return wrapper
+    return decorate
+def export_on_exit(path):
+    registry.enabled = True
+    atexit.register(registry.write, path)
+if os.environ.get("GROWX_METRICS_FILE"):
+    export_on_exit(os.environ["GROWX_METRICS_FILE"])
@@ -0,0 +1,123 @@
+import threading
+import numpy as np
+class TickerIndex:
+    # Process-wide ticker -> integer id map shared by every position book, so
+    # one quote vector can value any number of accounts
+    def __init__(self):
+        self.ids = {}
+        self.tickers = []
+        self._lock = threading.Lock()
+    def id(self, ticker):
+        ticker_id = self.ids.get(ticker)
+        if ticker_id is None:
+            with self._lock:
+                ticker_id = self.ids.get(ticker)
+                if ticker_id is None:
+                    ticker_id = len(self.tickers)
+                    self.tickers.append(ticker)
+                    self.ids[ticker] = ticker_id
+        return ticker_id
+    def quote_vector(self, prices):
+        # Tickers without a price are NaN so they never silently count as zero
+        quotes = np.full(len(self.tickers), np.nan)
+        for ticker, price in prices.items():
+            ticker_id = self.ids.get(ticker)
+            if ticker_id is not None:
+                quotes[ticker_id] = price
+        return quotes
+ticker_index = TickerIndex()
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+class PositionBook:
+    # Parallel arrays of (ticker id, quantity, avg price, investment), one slot per
+    # held ticker. Reads and writes keep the old {ticker: (quantity, avg_price,
+    # investment)} dict interface; total investment is updated on every write.
+    __slots__ = ("index", "_slots", "_ids", "_quantity", "_avg_price", "_investment", "_size", "total_investment")
+    def __init__(self, index=ticker_index, capacity=4):
+        self.index = index
+        self._slots = {}
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._quantity = np.zeros(capacity)
+        self._avg_price = np.zeros(capacity)
+        self._investment = np.zeros(capacity)
+        self._size = 0
+        self.total_investment = 0.0
+    def _grow(self):
+        capacity = max(len(self._ids) * 2, 4)
+        for name in ("_ids", "_quantity", "_avg_price", "_investment"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+    def __len__(self):
+        return self._size
+    def __bool__(self):
+        return self._size > 0
+    def __contains__(self, ticker):
+        return ticker in self._slots
+    def keys(self):
+        # Slot order, which matches the order of arrays()
+        return [self.index.tickers[ticker_id] for ticker_id in self._ids[:self._size]]
+    def __iter__(self):
+        return iter(self.keys())
+    def __getitem__(self, ticker):
+        slot = self._slots[ticker]
+        return (_number(self._quantity[slot]), float(self._avg_price[slot]), float(self._investment[slot]))
+    def get(self, ticker, default=None):
+        return self[ticker] if ticker in self._slots else default
+    def items(self):
+        return [(ticker, self[ticker]) for ticker in self.keys()]
+    def __setitem__(self, ticker, position):
+        quantity, avg_price, investment = position
+        slot = self._slots.get(ticker)
+        if slot is None:
+            if self._size == len(self._ids):
+                self._grow()
+            slot = self._slots[ticker] = self._size
+            self._ids[slot] = self.index.id(ticker)
+            self._investment[slot] = 0.0
+            self._size += 1
+        self.total_investment += investment - self._investment[slot]
+        self._quantity[slot] = quantity
+        self._avg_price[slot] = avg_price
+        self._investment[slot] = investment
+    def __delitem__(self, ticker):
+        slot = self._slots.pop(ticker)
+        self.total_investment -= self._investment[slot]
+        last = self._size - 1
+        if slot != last:
+            # Move the last slot into the hole to keep the arrays dense
+            moved = self.index.tickers[self._ids[last]]
+            self._slots[moved] = slot
+            for array in (self._ids, self._quantity, self._avg_price, self._investment):
+                array[slot] = array[last]
+        self._size = last
+        if not self._slots:
+            self.total_investment = 0.0
+    def arrays(self):
+        n = self._size
+        return self._ids[:n], self._quantity[:n], self._avg_price[:n], self._investment[:n]
+    def market_values(self, quotes):
+        ids, quantity, _, _ = self.arrays()
+        return quantity * quotes[ids]
+    def value(self, quotes):
+        ids, quantity, _, _ = self.arrays()
+        return float(quantity @ quotes[ids])
+    def totals(self, quotes):
+        # (market value, investment) over the positions that have a quote
+        ids, quantity, _, investment = self.arrays()
+        values = quantity * quotes[ids]
+        priced = ~np.isnan(values)
+        if priced.all():
+            return float(values.sum()), float(self.total_investment)
+        return float(values[priced].sum()), float(investment[priced].sum())
+def value_books(books, quotes):
+    # Market value of many accounts against one quote vector in a single pass
+    books = list(books)
+    if not books:
+        return np.zeros(0)
+    ids = np.concatenate([book.arrays()[0] for book in books])
+    quantity = np.concatenate([book.arrays()[1] for book in books])
+    owner = np.repeat(np.arange(len(books)), [len(book) for book in books])
+    return np.bincount(owner, weights=quantity * quotes[ids], minlength=len(books))
@@ -0,0 +1,227 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import registry, timed
+PERIOD_DAYS = {
+    "1d": 1,
+    "5d": 5,
+    "1mo": 30,
+    "3mo": 91,
+    "6mo": 182,
+    "1y": 365,
+    "2y": 730,
+    "5y": 1826,
+    "10y": 3652,
+}
+class QuoteNotFound(LookupError):
+    pass
+def valid_ticker(ticker):
+    # Exchange symbols, index (^GSPC) and FX/futures (EURUSD=X) included; tickers
+    # name files on disk, so nothing with a path separator gets through
+    return isinstance(ticker, str) and re.fullmatch(r"[A-Z0-9.^=-]{1,15}", ticker.upper()) is not None
+def unique_tickers(tickers):
+    return list(dict.fromkeys(t.upper() for t in tickers))
+class QuoteProvider:
+    def get_price(self, ticker):
+        raise NotImplementedError
+    def get_prices(self, tickers, max_workers=8):
+        # Returns (prices, errors) so one bad ticker never hides the others
+        tickers = unique_tickers(tickers)
+        prices = {}
+        errors = {}
+        if not tickers:
+            return prices, errors
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers))) as pool:
+            futures = {pool.submit(self.get_price, ticker): ticker for ticker in tickers}
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    prices[ticker] = future.result()
+                except Exception as e:
+                    errors[ticker] = e
+        return prices, errors
+    def get_history(self, ticker, period="1y", start=None):
+        raise NotImplementedError
+class YahooQuoteProvider(QuoteProvider):
+    # yfinance and pandas are imported on first use; they dominate startup time
+    @timed("growx_quote_fetch", provider="yahoo", call="get_price")
+    def get_price(self, ticker):
+        import yfinance as yf
+        # A one-day history frame is far lighter than the full .info payload
+        hist = yf.Ticker(ticker).history(period="1d")
+        if hist.empty:
+            raise QuoteNotFound(f"Could not find data for ticker: {ticker}")
+        return float(hist["Close"].iloc[-1])
+    @timed("growx_quote_fetch", provider="yahoo", call="get_prices")
+    def get_prices(self, tickers, max_workers=8):
+        import pandas as pd
+        import yfinance as yf
+        tickers = unique_tickers(tickers)
+        prices = {}
+        errors = {}
+        if not tickers:
+            return prices, errors
+        # One batched download for every ticker instead of a round-trip each. yfinance
+        # turns per-ticker failures, 429s included, into empty columns, and a failed
+        # batch raises; the scheduler in front retries both through get_price.
+        data = yf.download(tickers, period="1d", auto_adjust=True, threads=max_workers, progress=False)
+        closes = data["Close"]
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(tickers[0])
+        for ticker in tickers:
+            series = closes[ticker].dropna() if ticker in closes else None
+            if series is None or series.empty:
+                errors[ticker] = QuoteNotFound(f"Could not find data for ticker: {ticker}")
+            else:
+                prices[ticker] = float(series.iloc[-1])
+        return prices, errors
+    @timed("growx_history_fetch", provider="yahoo")
+    def get_history(self, ticker, period="1y", start=None):
+        import yfinance as yf
+        if start is not None:
+            return yf.Ticker(ticker).history(start=start)
+        return yf.Ticker(ticker).history(period=period)
+class LocalQuoteProvider(QuoteProvider):
+    # Deterministic random-walk prices seeded from the ticker symbol, for offline use
+    def __init__(self, tickers=None, end_date=None, history_days=PERIOD_DAYS["10y"]):
+        import pandas as pd
+        self.tickers = {t.upper() for t in tickers} if tickers is not None else None
+        self.end_date = pd.Timestamp(end_date or "2024-01-02").normalize()
+        self.history_days = history_days
+        self._dates = None
+        self._closes = {}
+    def _seed(self, ticker):
+        return int(hashlib.sha256(ticker.encode()).hexdigest()[:16], 16)
+    def _series(self, ticker):
+        import pandas as pd
+        ticker = ticker.upper()
+        if self.tickers is not None and ticker not in self.tickers:
+            raise QuoteNotFound(f"Could not find data for ticker: {ticker}")
+        if ticker not in self._closes:
+            rng = random.Random(self._seed(ticker))
+            if self._dates is None:
+                # Every ticker shares one calendar
+                self._dates = pd.bdate_range(end=self.end_date, periods=self.history_days)
+            dates = self._dates
+            price = rng.uniform(10, 500)
+            drift = rng.uniform(-0.0002, 0.0006)
+            vol = rng.uniform(0.01, 0.03)
+            closes = []
+            for _ in range(len(dates)):
+                price *= 1 + rng.gauss(drift, vol)
+                price = max(price, 0.01)
+                closes.append(round(price, 2))
+            self._closes[ticker] = pd.Series(closes, index=dates, dtype=float)
+        return self._closes[ticker]
+    @timed("growx_quote_fetch", provider="local", call="get_price")
+    def get_price(self, ticker):
+        return float(self._series(ticker).iloc[-1])
+    @timed("growx_quote_fetch", provider="local", call="get_prices")
+    def get_prices(self, tickers, max_workers=8):
+        prices = {}
+        errors = {}
+        for ticker in unique_tickers(tickers):
+            try:
+                prices[ticker] = self.get_price(ticker)
+            except QuoteNotFound as e:
+                errors[ticker] = e
+        return prices, errors
+    @timed("growx_history_fetch", provider="local")
+    def get_history(self, ticker, period="1y", start=None):
+        import pandas as pd
+        close = self._series(ticker)
+        if start is not None:
+            close = close[close.index >= pd.Timestamp(start)]
+        elif period in PERIOD_DAYS:
+            close = close[close.index > self.end_date - pd.Timedelta(days=PERIOD_DAYS[period])]
+        hist = pd.DataFrame({
+            "Open": close.shift(1).fillna(close),
+            "High": close * 1.01,
+            "Low": close * 0.99,
+            "Close": close,
+            "Volume": 1_000_000,
+        })
+        return hist
+class CachedQuoteProvider(QuoteProvider):
+    # TTL + LRU cache in front of another provider; each key is fetched at most once per window
+    def __init__(self, provider, price_ttl=60, history_ttl=900, max_entries=4096):
+        self.provider = provider
+        self.price_ttl = price_ttl
+        self.history_ttl = history_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = (time.monotonic() + ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+    def invalidate(self, ticker=None):
+        with self._lock:
+            if ticker is None:
+                self._cache.clear()
+                return
+            ticker = ticker.upper()
+            for key in [k for k in self._cache if k[1] == ticker]:
+                del self._cache[key]
+    def get_price(self, ticker):
+        key = ("price", ticker.upper())
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+        price = self.provider.get_price(ticker)
+        self._store(key, price, self.price_ttl)
+        return price
+    def get_prices(self, tickers, max_workers=8):
+        prices = {}
+        missing = []
+        for ticker in unique_tickers(tickers):
+            entry = self._lookup(("price", ticker))
+            if entry is not None:
+                prices[ticker] = entry[1]
+            else:
+                missing.append(ticker)
+        if not missing:
+            return prices, {}
+        fetched, errors = self.provider.get_prices(missing, max_workers)
+        for ticker, price in fetched.items():
+            self._store(("price", ticker), price, self.price_ttl)
+        prices.update(fetched)
+        return prices, errors
+    def get_history(self, ticker, period="1y", start=None):
+        key = ("history", ticker.upper(), period, start)
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+        hist = self.provider.get_history(ticker, period, start)
+        self._store(key, hist, self.history_ttl)
+        return hist
+_default_provider = None
+def default_provider():
+    global _default_provider
+    if _default_provider is None:
+        from fetch import ScheduledQuoteProvider
+        # Cache misses are coalesced, rate limited and retried before they reach Yahoo
+        _default_provider = CachedQuoteProvider(ScheduledQuoteProvider(YahooQuoteProvider()))
+        registry.track_cache("quotes", _default_provider)
+    return _default_provider
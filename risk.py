@@ -0,0 +1,103 @@
+import datetime
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+import numpy as np
+from screener import align_closes
+from metrics import timed
+TRADING_DAYS = 252
+class RiskModel:
+    # Aligned daily returns are computed once per (date, period) over the union of
+    # every ticker asked for so far, so users holding overlapping tickers share the
+    # history loading and only a ticker nobody has asked for today triggers a
+    # rebuild. Each portfolio then takes its own columns and drops only the days
+    # where one of its own tickers has no return, so a short history held by
+    # someone else never shortens its window.
+    def __init__(self, store, benchmark="SPY", period="1y", confidence=0.95, max_universes=4):
+        self.store = store
+        self.benchmark = benchmark
+        self.period = period
+        self.confidence = confidence
+        self.max_universes = max_universes
+        self.builds = 0
+        self._universes = OrderedDict()
+        self._lock = threading.Lock()
+    @timed("growx_risk_build")
+    def _build(self, tickers):
+        dates, loaded, matrix, errors = align_closes(self.store, tickers, self.period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = matrix[1:] / matrix[:-1] - 1
+        self.builds += 1
+        return {
+            "index": {ticker: i for i, ticker in enumerate(loaded)},
+            "returns": returns,
+            "errors": errors,
+        }
+    def universe(self, tickers):
+        key = (datetime.date.today(), self.period)
+        with self._lock:
+            universe = self._universes.get(key)
+            if universe is not None:
+                self._universes.move_to_end(key)
+                known = universe["index"].keys() | universe["errors"].keys()
+                if all(ticker in known for ticker in tickers):
+                    return universe
+                tickers = list(universe["index"]) + [ticker for ticker in tickers if ticker not in known]
+            elif self.benchmark not in tickers:
+                tickers = list(tickers) + [self.benchmark]
+            universe = self._universes[key] = self._build(tickers)
+            while len(self._universes) > self.max_universes:
+                self._universes.popitem(last=False)
+            return universe
+    def portfolio_risk(self, values):
+        # values: {ticker: market value}. VaR figures are one-day losses in currency.
+        values = {ticker: value for ticker, value in values.items() if value and not np.isnan(value)}
+        universe = self.universe(list(values))
+        held = [ticker for ticker in values if ticker in universe["index"]]
+        errors = {ticker: universe["errors"][ticker] for ticker in values if ticker not in universe["index"]}
+        idx = np.array([universe["index"][ticker] for ticker in held], dtype=np.int64)
+        returns = universe["returns"][:, idx]
+        # Only days where every held ticker has a return, so the covariance stays positive semi-definite
+        complete = ~np.isnan(returns).any(axis=1)
+        returns = returns[complete]
+        if not held or len(returns) < 2:
+            raise ValueError("Not enough price history to compute risk.")
+        exposure = np.array([values[ticker] for ticker in held], dtype=float)
+        total = exposure.sum()
+        weights = exposure / total
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+        portfolio_returns = returns @ weights
+        marginal = cov @ weights
+        variance = float(weights @ marginal)
+        sigma = np.sqrt(variance)
+        z = NormalDist().inv_cdf(self.confidence)
+        betas = np.full(len(idx), np.nan)
+        benchmark = universe["index"].get(self.benchmark)
+        if benchmark is not None:
+            market = universe["returns"][complete, benchmark]
+            both = ~np.isnan(market)
+            if both.sum() > 1:
+                joint = np.cov(np.column_stack((returns[both], market[both])), rowvar=False)
+                if joint[-1, -1] > 0:
+                    betas = joint[:-1, -1] / joint[-1, -1]
+        contributions = weights * marginal / variance if variance > 0 else np.zeros(len(idx))
+        return {
+            "value": float(total),
+            "volatility": float(sigma * np.sqrt(TRADING_DAYS)),
+            "beta": float(weights @ betas),
+            "confidence": self.confidence,
+            "historical_var": float(-np.quantile(portfolio_returns, 1 - self.confidence) * total),
+            "parametric_var": float((z * sigma - weights @ returns.mean(axis=0)) * total),
+            "observations": len(portfolio_returns),
+            "positions": {
+                ticker: {"weight": float(w), "beta": float(b), "risk_contribution": float(c)}
+                for ticker, w, b, c in zip(held, weights, betas, contributions)
+            },
+            "errors": errors,
+        }
+_default_model = None
+def default_risk_model(store):
+    global _default_model
+    if _default_model is None:
+        _default_model = RiskModel(store)
+    return _default_model
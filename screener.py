@@ -0,0 +1,104 @@
+import numpy as np
+from metrics import timed
+DEFAULT_UNIVERSE = ["AAPL", "MSFT", "GOOGL", "TSLA", "AMZN", "META", "NVDA", "PFE", "JNJ", "MRNA", "F", "GM"]
+def align_closes(store, tickers, period="1y"):
+    # Build one (dates x tickers) close matrix, forward-filling gaps in each column
+    loaded = []
+    errors = {}
+    for ticker in tickers:
+        try:
+            ts, close = store.closes(ticker, period)
+        except Exception as e:
+            errors[ticker] = e
+            continue
+        if len(ts):
+            loaded.append((ticker, ts, close))
+    if not loaded:
+        return np.empty(0, dtype="<i8"), [], np.empty((0, 0)), errors
+    dates = np.unique(np.concatenate([ts for _, ts, _ in loaded]))
+    matrix = np.full((len(dates), len(loaded)), np.nan)
+    for j, (_, ts, close) in enumerate(loaded):
+        matrix[np.searchsorted(dates, ts), j] = close
+    return dates, [ticker for ticker, _, _ in loaded], ffill(matrix), errors
+def ffill(matrix):
+    rows = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+def sma(matrix, window):
+    # Running-sum SMA; a window containing any missing bar yields NaN
+    valid = ~np.isnan(matrix)
+    sums = np.cumsum(np.where(valid, matrix, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[0] < window:
+        return out
+    window_sums = sums[window - 1:].copy()
+    window_sums[1:] -= sums[:-window]
+    window_counts = counts[window - 1:].copy()
+    window_counts[1:] -= counts[:-window]
+    out[window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return out
+def ewm(matrix, alpha):
+    # Recursive smoothing steps over dates but is vectorized across every ticker
+    out = np.full(matrix.shape, np.nan)
+    state = np.full(matrix.shape[1], np.nan)
+    for i, row in enumerate(matrix):
+        updated = np.where(np.isnan(state), row, state + alpha * (row - state))
+        state = np.where(np.isnan(row), state, updated)
+        out[i] = state
+    return out
+def ema(matrix, span):
+    return ewm(matrix, 2.0 / (span + 1))
+def rsi(matrix, period=14):
+    change = np.diff(matrix, axis=0, prepend=np.nan)
+    gain = ewm(np.where(np.isnan(change), np.nan, np.clip(change, 0, None)), 1.0 / period)
+    loss = ewm(np.where(np.isnan(change), np.nan, np.clip(-change, 0, None)), 1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100 - 100 / (1 + gain / loss)
+    return np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), out)
+def momentum(matrix, lookback):
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[0] > lookback:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[lookback:] = matrix[lookback:] / matrix[:-lookback] - 1
+    return out
+def crossover_signal(short, long):
+    # Rule-based recommendation:
+    # - If the short SMA is above the long SMA, the stock is in an uptrend
+    # - If the short SMA is below the long SMA, the stock is in a downtrend
+    return np.where(short > long, "Strong Buy", np.where(short < long, "Avoid", "Neutral"))
+class Screener:
+    def __init__(self, store, short_window=20, long_window=50, rsi_period=14, momentum_lookback=63, period="1y"):
+        self.store = store
+        self.short_window = short_window
+        self.long_window = long_window
+        self.rsi_period = rsi_period
+        self.momentum_lookback = momentum_lookback
+        self.period = period
+    def evaluate(self, matrix):
+        short = sma(matrix, self.short_window)
+        long = sma(matrix, self.long_window)
+        crossed_up = (short[-1] > long[-1]) & (short[-2] <= long[-2]) if len(matrix) > 1 else np.zeros(matrix.shape[1], dtype=bool)
+        return {
+            "price": matrix[-1],
+            "sma_short": short[-1],
+            "sma_long": long[-1],
+            "ema_short": ema(matrix, self.short_window)[-1],
+            "ema_long": ema(matrix, self.long_window)[-1],
+            "rsi": rsi(matrix, self.rsi_period)[-1],
+            "momentum": momentum(matrix, self.momentum_lookback)[-1],
+            "crossed_up": crossed_up,
+            "signal": crossover_signal(short[-1], long[-1]),
+        }
+    @timed("growx_indicators", call="screen")
+    def run(self, tickers=DEFAULT_UNIVERSE):
+        dates, loaded, matrix, errors = align_closes(self.store, tickers, self.period)
+        if not loaded:
+            return [], errors
+        columns = self.evaluate(matrix)
+        results = []
+        for j, ticker in enumerate(loaded):
+            row = {name: values[j].item() for name, values in columns.items()}
+            row["ticker"] = ticker
+            results.append(row)
+        return results, errors
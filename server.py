@@ -0,0 +1,192 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from headless import CommandRunner, check_arguments
+from quotes import LocalQuoteProvider
+from ledger import Ledger
+# Ops a network session may run. Account ops always act on the session's own
+# user; ops that read or write server paths (stream, chart directories) or act
+# on every account (run_sips, check_alerts) are left to the local headless runner.
+PUBLIC_OPS = {"signup", "login", "screen", "search", "chart", "metrics"}
+ACCOUNT_OPS = {"deposit", "withdraw", "buy", "sell", "orders", "value", "risk", "sip", "subscribe", "watch", "unwatch", "alert", "alerts", "cancel_alert"}
+def authorize(command, session_user):
+    # Ties a client command to the logged-in session; returns an error message, or
+    # None with the command rewritten to act as session_user
+    op = command.get("op")
+    if op not in PUBLIC_OPS and op not in ACCOUNT_OPS:
+        return f"Command not available over the network: {op}"
+    if "path" in command or "directory" in command:
+        return "Server paths can't be chosen by clients."
+    error = check_arguments(command)
+    if error is not None:
+        return error
+    # Trades always execute at the server's quote
+    command.pop("price", None)
+    if op not in ACCOUNT_OPS and "user" not in command:
+        return None
+    if session_user is None:
+        return "Log in first."
+    if op == "orders":
+        orders = command.get("orders")
+        if not isinstance(orders, list) or not all(isinstance(order, dict) for order in orders):
+            return "Orders must be a list of objects."
+        for order in orders:
+            if order.setdefault("user", session_user) != session_user:
+                return "Commands can only act on the logged-in account."
+            order.pop("price", None)
+        return None
+    if command.setdefault("user", session_user) != session_user:
+        return "Commands can only act on the logged-in account."
+    return None
+class TradingServer:
+    # JSON lines over TCP: one command per line in, one result per line out.
+    # Commands are the same as headless.CommandRunner. Blocking work runs on a
+    # thread pool; commands touching the same account are serialized by a
+    # per-account asyncio lock, and quotes are fetched before the lock is taken
+    # so a slow ticker never holds up other sessions.
+    def __init__(self, runner, max_workers=32):
+        self.runner = runner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="growx")
+        self.locks = {}
+        self.sessions = 0
+    def _accounts(self, command):
+        if command.get("op") == "orders":
+            return sorted({order["user"] for order in command.get("orders", []) if "user" in order})
+        name = command.get("user", command.get("name"))
+        return [name] if name is not None else []
+    async def _prefetch_price(self, command):
+        if command.get("op") in ("buy", "sell") and "ticker" in command:
+            loop = asyncio.get_running_loop()
+            try:
+                command["price"] = await loop.run_in_executor(self.executor, self.runner.quotes.get_price, command["ticker"].upper())
+            except Exception:
+                # Leave the price unset; execute() reports the error for this command only
+                pass
+    async def execute(self, command):
+        await self._prefetch_price(command)
+        locks = [self.locks.setdefault(name, asyncio.Lock()) for name in self._accounts(command)]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.runner.execute, command)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        session_user = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    command = json.loads(line)
+                    if not isinstance(command, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    result = {"ok": False, "op": None, "error": f"Invalid command: {e}"}
+                else:
+                    error = authorize(command, session_user)
+                    if error is not None:
+                        result = {"ok": False, "op": command.get("op"), "error": error}
+                    else:
+                        result = await self.execute(command)
+                        if result["ok"] and command.get("op") in ("signup", "login"):
+                            session_user = command["name"]
+                writer.write(json.dumps(result).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+async def _load_session(host, port, session_id, requests, tickers, latencies, failures):
+    reader, writer = await asyncio.open_connection(host, port)
+    name = f"load-{os.getpid()}-{session_id}"
+    commands = [{"op": "signup", "name": name, "email": f"{name}@example.com", "password": "load", "deposit": 1_000_000}]
+    for i in range(requests):
+        ticker = tickers[(session_id + i) % len(tickers)]
+        kind = i % 4
+        if kind in (0, 1):
+            commands.append({"op": "buy", "ticker": ticker, "quantity": 1})
+        elif kind == 2:
+            commands.append({"op": "sell", "ticker": tickers[(session_id + i - 2) % len(tickers)], "quantity": 1})
+        else:
+            commands.append({"op": "value"})
+    try:
+        for command in commands:
+            started = time.perf_counter()
+            writer.write(json.dumps(command).encode() + b"\n")
+            await writer.drain()
+            result = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if not result["ok"]:
+                failures.append(result["error"])
+    finally:
+        writer.close()
+async def load_test(host="127.0.0.1", port=8765, sessions=50, requests=100, tickers=("AAPL", "MSFT", "GOOGL", "AMZN", "TSLA")):
+    latencies = []
+    failures = []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        _load_session(host, port, i, requests, list(tickers), latencies, failures) for i in range(sessions)
+    ])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "sessions": sessions,
+        "requests": len(latencies),
+        "failures": len(failures),
+        "elapsed_s": elapsed,
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GrowX multi-session trading server and load generator.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    sub = parser.add_subparsers(dest="mode", required=True)
+    serve = sub.add_parser("serve", help="run the server")
+    serve.add_argument("--data-dir", help="directory for accounts, ledger and price history")
+    serve.add_argument("--offline", action="store_true", help="use deterministic local prices instead of Yahoo Finance")
+    serve.add_argument("--workers", type=int, default=32)
+    load = sub.add_parser("load", help="run the load generator against a running server")
+    load.add_argument("--sessions", type=int, default=50)
+    load.add_argument("--requests", type=int, default=100, help="requests per session")
+    args = parser.parse_args(argv)
+    if args.mode == "serve":
+        if args.data_dir:
+            os.environ["GROWX_DATA"] = args.data_dir
+        runner = CommandRunner(quotes=LocalQuoteProvider() if args.offline else None, ledger=Ledger())
+        server = TradingServer(runner, max_workers=args.workers)
+        print(f"GrowX server listening on {args.host}:{args.port}")
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            runner.close()
+    else:
+        print(json.dumps(asyncio.run(load_test(args.host, args.port, args.sessions, args.requests)), indent=2))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import os
+def data_dir():
+    return os.environ.get("GROWX_DATA", ".growx")
+def symbols_path():
+    # Listing of valid tickers (CSV or Parquet); see symbols.py
+    return os.environ.get("GROWX_SYMBOLS", os.path.join(data_dir(), "symbols.csv"))
+def chart_dir():
+    # When set, charts are written here as images instead of opening a window
+    return os.environ.get("GROWX_CHARTS")
@@ -0,0 +1,143 @@
+import argparse
+import datetime
+import json
+import os
+import numpy as np
+from ledger import make_entry, reversals
+from trading import add_months
+from metrics import timed
+def reschedule(due, day, today):
+    # Next run counted from the plan's own date on its own day of month, plus how many
+    # monthly runs were missed between due and today; only one of them is settled
+    due = datetime.date.fromisoformat(due)
+    months = 1
+    while add_months(due, months, day) <= today:
+        months += 1
+    return add_months(due, months, day).isoformat(), months - 1
+class SipEngine:
+    # Settles every due SIP plan in chunks. Each run prices every sector ticker
+    # once, and allocation for all of a sector's subscribers in a chunk is one
+    # array computation. Leftover cash per ticker is carried to the next run
+    # instead of being dropped, or shares are bought fractionally.
+    def __init__(self, quotes, accounts, sectors, ledger=None, fractional=False, chunk_size=10000):
+        self.quotes = quotes
+        self.accounts = accounts
+        self.sectors = sectors
+        self.ledger = ledger
+        self.fractional = fractional
+        self.chunk_size = chunk_size
+    def _allocate(self, amounts, carry, weights, prices):
+        budget = amounts[:, None] * weights[None, :] + carry
+        priced = ~np.isnan(prices)
+        safe_prices = np.where(priced, prices, 1.0)
+        if self.fractional:
+            shares = np.floor(budget / safe_prices * 1e6) / 1e6
+        else:
+            shares = np.floor(budget / safe_prices)
+        shares = np.where(priced[None, :], shares, 0.0)
+        cost = shares * safe_prices
+        # Unpriced tickers keep their whole budget as carry for the next run
+        return shares, cost, budget - cost
+    def settle_chunk(self, rows, prices, today):
+        balances = {row[1]: row[3] for row in rows}
+        opening = dict(balances)
+        added = {}
+        plan_updates = []
+        entries = []
+        changed_users = set()
+        summary = {"plans": len(rows), "settled": 0, "skipped": 0, "invested": 0.0, "missed": 0, "late_plans": 0}
+        schedule = []
+        for row in rows:
+            next_run, missed = reschedule(row[7], row[8], today)
+            schedule.append(next_run)
+            if missed:
+                summary["missed"] += missed
+                summary["late_plans"] += 1
+        by_sector = {}
+        for i, row in enumerate(rows):
+            by_sector.setdefault(row[4], []).append(i)
+        for sector, indices in by_sector.items():
+            allocation = self.sectors.get(sector)
+            if not allocation:
+                summary["skipped"] += len(indices)
+                plan_updates.extend((schedule[i], rows[i][6], rows[i][0]) for i in indices)
+                continue
+            sector_tickers = list(allocation)
+            weights = np.array([allocation[ticker] for ticker in sector_tickers])
+            price_vector = np.array([prices.get(ticker, np.nan) for ticker in sector_tickers])
+            amounts = np.array([rows[i][5] for i in indices])
+            carry = np.array([[rows[i][6].get(ticker, 0.0) for ticker in sector_tickers] for i in indices])
+            shares, cost, new_carry = self._allocate(amounts, carry, weights, price_vector)
+            plan_cost = cost.sum(axis=1)
+            for k, i in enumerate(indices):
+                plan_id, user_id, name = rows[i][:3]
+                if plan_cost[k] > balances[user_id]:
+                    summary["skipped"] += 1
+                    plan_updates.append((schedule[i], rows[i][6], plan_id))
+                    continue
+                balances[user_id] -= plan_cost[k]
+                changed_users.add(user_id)
+                for j in np.flatnonzero(shares[k]):
+                    ticker = sector_tickers[j]
+                    quantity, total_cost = float(shares[k, j]), float(cost[k, j])
+                    change = added.get((user_id, ticker), (0.0, 0.0))
+                    added[(user_id, ticker)] = (change[0] + quantity, change[1] + total_cost)
+                    entries.append(make_entry(name, "sip", ticker, quantity, float(price_vector[j]), -total_cost, (quantity, total_cost)))
+                summary["settled"] += 1
+                summary["invested"] += float(plan_cost[k])
+                plan_updates.append((schedule[i], {t: float(c) for t, c in zip(sector_tickers, new_carry[k]) if c > 0}, plan_id))
+        # Ledger first, and reversed if the store then fails, as in TradingService.commit
+        if self.ledger is not None and entries:
+            self.ledger.append_many(entries)
+        try:
+            self.accounts.settle_sip_plans(
+                [(float(balances[user_id] - opening[user_id]), user_id) for user_id in changed_users],
+                added,
+                plan_updates,
+            )
+        except BaseException:
+            if self.ledger is not None and entries:
+                self.ledger.append_many(reversals(entries))
+            raise
+        return summary
+    @timed("growx_sip_run")
+    def run_due(self, today=None):
+        today = today or datetime.date.today()
+        tickers = sorted({ticker for allocation in self.sectors.values() for ticker in allocation})
+        prices, errors = self.quotes.get_prices(tickers)
+        # missed: monthly runs that fell between a plan's due date and today (e.g. the
+        # engine didn't run for a while); they are reported, not settled retroactively
+        summary = {"plans": 0, "settled": 0, "skipped": 0, "invested": 0.0, "missed": 0, "late_plans": 0}
+        for rows in self.accounts.due_sip_plans(today.isoformat(), self.chunk_size):
+            for key, value in self.settle_chunk(rows, prices, today).items():
+                summary[key] += value
+        summary["errors"] = {ticker: str(e) for ticker, e in errors.items()}
+        return summary
+def main(argv=None):
+    from GrowX import sectors
+    from quotes import LocalQuoteProvider, default_provider
+    from storage import AccountStore
+    from ledger import Ledger
+    parser = argparse.ArgumentParser(description="Settle every SIP plan that is due.")
+    parser.add_argument("--date", help="run date (YYYY-MM-DD), default today")
+    parser.add_argument("--data-dir", help="directory for accounts and ledger")
+    parser.add_argument("--offline", action="store_true", help="use deterministic local prices instead of Yahoo Finance")
+    parser.add_argument("--fractional", action="store_true", help="buy fractional shares instead of carrying leftover cash")
+    args = parser.parse_args(argv)
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    ledger = Ledger()
+    engine = SipEngine(
+        LocalQuoteProvider() if args.offline else default_provider(),
+        AccountStore(),
+        sectors,
+        ledger,
+        fractional=args.fractional,
+    )
+    today = datetime.date.fromisoformat(args.date) if args.date else None
+    try:
+        print(json.dumps(engine.run_due(today), indent=2))
+    finally:
+        ledger.close()
+if __name__ == "__main__":
+    main()
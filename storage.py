@@ -0,0 +1,280 @@
+import json
+import os
+import sqlite3
+import threading
+from settings import data_dir
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    password TEXT NOT NULL,
+    phone_number TEXT,
+    balance REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS positions (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    ticker TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    avg_price REAL NOT NULL,
+    investment REAL NOT NULL,
+    PRIMARY KEY (user_id, ticker)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    ticker TEXT NOT NULL,
+    PRIMARY KEY (user_id, ticker)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sip_plans (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    sector TEXT NOT NULL,
+    amount REAL NOT NULL,
+    next_run TEXT NOT NULL,
+    carry TEXT NOT NULL DEFAULT '{}',
+    day INTEGER
+);
+CREATE INDEX IF NOT EXISTS sip_plans_due ON sip_plans (next_run);
+CREATE INDEX IF NOT EXISTS sip_plans_user ON sip_plans (user_id);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    ticker TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    threshold REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_user ON alerts (user_id);
+"""
+# Positions change by deltas; avg price is re-derived as investment / quantity
+ADD_POSITION = (
+    "INSERT INTO positions (user_id, ticker, quantity, avg_price, investment) "
+    "VALUES (?1, ?2, ?3, CASE WHEN ?3 != 0 THEN ?4 / ?3 ELSE 0 END, ?4) "
+    "ON CONFLICT (user_id, ticker) DO UPDATE SET "
+    "avg_price = CASE WHEN quantity + excluded.quantity > 0 "
+    "THEN (investment + excluded.investment) / (quantity + excluded.quantity) ELSE avg_price END, "
+    "quantity = quantity + excluded.quantity, investment = investment + excluded.investment"
+)
+class AccountStore:
+    # Users, cash, positions and watchlists in SQLite. Only the users row is read
+    # on lookup; a user's positions are loaded when they log in.
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), "accounts.db")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        if "day" not in {row[1] for row in self._conn.execute("PRAGMA table_info(sip_plans)")}:
+            # Stores from before plans kept their day of month; NULL falls back to next_run's day
+            self._conn.execute("ALTER TABLE sip_plans ADD COLUMN day INTEGER")
+    def close(self):
+        self._conn.close()
+    def exists(self, name):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users WHERE name = ?", (name,)).fetchone() is not None
+    def find_user(self, name):
+        # Returns (id, name, email, password_hash, phone_number, balance) or None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, name, email, password, phone_number, balance FROM users WHERE name = ?", (name,)
+            ).fetchone()
+        return row
+    def find_by_email(self, email):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM users WHERE email = ?", (email,))]
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    def create_user(self, user):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO users (name, email, password, phone_number, balance) VALUES (?, ?, ?, ?, ?)",
+                (user.name, user.email, user.password, user.phone_number, user.balance),
+            )
+            user.id = cursor.lastrowid
+    def create_users(self, users):
+        # Bulk signup in one transaction, e.g. for imports and fixtures
+        with self._lock, self._conn:
+            for user in users:
+                cursor = self._conn.execute(
+                    "INSERT INTO users (name, email, password, phone_number, balance) VALUES (?, ?, ?, ?, ?)",
+                    (user.name, user.email, user.password, user.phone_number, user.balance),
+                )
+                user.id = cursor.lastrowid
+    def load_portfolio(self, user):
+        with self._lock:
+            positions = self._conn.execute(
+                "SELECT ticker, quantity, avg_price, investment FROM positions WHERE user_id = ?", (user.id,)
+            ).fetchall()
+            watchlist = self._conn.execute("SELECT ticker FROM watchlist WHERE user_id = ?", (user.id,)).fetchall()
+        for ticker, quantity, avg_price, investment in positions:
+            user.portfolio[ticker] = (quantity, avg_price, investment)
+        user.watchlist.update(ticker for (ticker,) in watchlist)
+    def refresh(self, user, tickers=(), balance=True):
+        # Re-reads the balance and the given positions, which the SIP engine or another
+        # session may have changed since the user was loaded
+        tickers = list(tickers)
+        with self._lock:
+            row = self._conn.execute("SELECT balance FROM users WHERE id = ?", (user.id,)).fetchone() if balance else None
+            positions = self._conn.execute(
+                f"SELECT ticker, quantity, avg_price, investment FROM positions WHERE user_id = ? AND ticker IN ({','.join('?' * len(tickers))})",
+                [user.id] + tickers,
+            ).fetchall() if tickers else []
+        if row is not None:
+            user.balance = row[0]
+        held = {ticker: (quantity, avg_price, investment) for ticker, quantity, avg_price, investment in positions}
+        for ticker in tickers:
+            if ticker in held:
+                user.portfolio[ticker] = held[ticker]
+            elif ticker in user.portfolio:
+                del user.portfolio[ticker]
+    def _add_positions(self, changes):
+        # changes: (user id, ticker, quantity delta, investment delta); a position that
+        # reaches zero is removed
+        self._conn.executemany(ADD_POSITION, changes)
+        self._conn.executemany(
+            "DELETE FROM positions WHERE user_id = ? AND ticker = ? AND quantity <= 1e-9", [change[:2] for change in changes]
+        )
+    def save_details(self, user):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE users SET email = ?, password = ?, phone_number = ? WHERE id = ?",
+                (user.email, user.password, user.phone_number, user.id),
+            )
+    def record_trades(self, trades):
+        # trades: (user, cash delta, {ticker: (quantity delta, investment delta)}), written
+        # in one transaction. Changes are applied as deltas rather than absolute values,
+        # so a session holding a stale copy of an account can't undo a SIP run's debit.
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE users SET balance = balance + ? WHERE id = ?", [(cash, user.id) for user, cash, _ in trades if cash]
+            )
+            self._add_positions([
+                (user.id, ticker, quantity, investment)
+                for user, _, positions in trades for ticker, (quantity, investment) in positions.items()
+            ])
+    def overwrite_accounts(self, accounts):
+        # accounts: {name: {"balance", "positions": {ticker: (quantity, avg_price, investment)}}}
+        # written as absolute values, for rebuilding the store from the ledger while
+        # nothing else is writing. Returns the names with no users row.
+        missing = []
+        with self._lock, self._conn:
+            for name, account in accounts.items():
+                row = self._conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    missing.append(name)
+                    continue
+                self._conn.execute("UPDATE users SET balance = ? WHERE id = ?", (account["balance"], row[0]))
+                self._conn.execute("DELETE FROM positions WHERE user_id = ?", (row[0],))
+                self._conn.executemany(
+                    "INSERT INTO positions (user_id, ticker, quantity, avg_price, investment) VALUES (?, ?, ?, ?, ?)",
+                    [(row[0], ticker) + tuple(position) for ticker, position in account["positions"].items()],
+                )
+        return missing
+    def add_to_watchlist(self, user, ticker):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO watchlist (user_id, ticker) VALUES (?, ?)", (user.id, ticker))
+    def remove_from_watchlist(self, user, ticker):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM watchlist WHERE user_id = ? AND ticker = ?", (user.id, ticker))
+    def add_sip_plan(self, user, sector, amount, next_run):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO sip_plans (user_id, sector, amount, next_run, day) VALUES (?, ?, ?, ?, ?)",
+                (user.id, sector, amount, next_run, int(next_run[8:10])),
+            )
+            return cursor.lastrowid
+    def sip_plans(self, user):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, sector, amount, next_run FROM sip_plans WHERE user_id = ? ORDER BY id", (user.id,)
+            ).fetchall()
+    def remove_sip_plan(self, user, plan_id):
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM sip_plans WHERE id = ? AND user_id = ?", (plan_id, user.id)).rowcount > 0
+    def add_alert(self, user, ticker, direction, threshold):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO alerts (user_id, ticker, direction, threshold) VALUES (?, ?, ?, ?)",
+                (user.id, ticker, direction, threshold),
+            )
+            return cursor.lastrowid
+    def alerts(self, user=None, chunk_size=10000):
+        # Yields (alert id, user name, ticker, direction, threshold), for one user or everyone
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT a.id, u.name, a.ticker, a.direction, a.threshold "
+                    "FROM alerts a JOIN users u ON u.id = a.user_id "
+                    "WHERE a.id > ? AND (? IS NULL OR a.user_id = ?) ORDER BY a.id LIMIT ?",
+                    (last_id, None if user is None else user.id, None if user is None else user.id, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield from rows
+    def remove_alerts(self, alert_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM alerts WHERE id = ?", [(alert_id,) for alert_id in alert_ids])
+    def remove_ticker_alerts(self, user, ticker):
+        # Also catches alerts another session added since this one loaded them
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM alerts WHERE user_id = ? AND ticker = ?", (user.id, ticker))
+    def due_sip_plans(self, today, chunk_size=10000):
+        # Yields chunks of (plan id, user id, name, balance, sector, amount, carry) due on or before today
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT p.id, p.user_id, u.name, u.balance, p.sector, p.amount, p.carry, p.next_run, p.day "
+                    "FROM sip_plans p JOIN users u ON u.id = p.user_id "
+                    "WHERE p.next_run <= ? AND p.id > ? ORDER BY p.id LIMIT ?",
+                    (today, last_id, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[:6] + (json.loads(row[6]),) + row[7:] for row in rows]
+    def held_tickers(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT ticker FROM positions ORDER BY ticker")]
+    def portfolios(self, chunk_size=10000):
+        # Yields chunks of (user id, name, balance, [(ticker, quantity, avg_price, investment)]) in id order
+        last_id = 0
+        while True:
+            with self._lock:
+                users = self._conn.execute(
+                    "SELECT id, name, balance FROM users WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+                ).fetchall()
+                if not users:
+                    return
+                rows = self._conn.execute(
+                    "SELECT user_id, ticker, quantity, avg_price, investment FROM positions WHERE user_id BETWEEN ? AND ?",
+                    (users[0][0], users[-1][0]),
+                ).fetchall()
+            last_id = users[-1][0]
+            held = {}
+            for user_id, *position in rows:
+                held.setdefault(user_id, []).append(tuple(position))
+            yield [(user_id, name, balance, held.get(user_id, [])) for user_id, name, balance in users]
+    def settle_sip_plans(self, balances, positions, plans):
+        # balances: (cash delta, user id); positions: {(user id, ticker): (quantity delta, investment delta)};
+        # plans: (next_run, carry dict, plan id). Written in one transaction.
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE users SET balance = balance + ? WHERE id = ?", balances)
+            self._add_positions([(user_id, ticker) + tuple(change) for (user_id, ticker), change in positions.items()])
+            self._conn.executemany(
+                "UPDATE sip_plans SET next_run = ?, carry = ? WHERE id = ?",
+                [(next_run, json.dumps(carry), plan_id) for next_run, carry, plan_id in plans],
+            )
+_default_store = None
+def default_account_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = AccountStore()
+    return _default_store
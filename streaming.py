@@ -0,0 +1,256 @@
+import argparse
+import csv
+import json
+import os
+import random
+import time
+import numpy as np
+from positions import PositionBook, ticker_index
+from history_store import DAY_NS
+class ReplaySource:
+    # Ticks from a CSV of ts,ticker,price rows (ts in epoch nanoseconds), as fast as
+    # possible or paced at `speed` times the recorded rate
+    def __init__(self, path, speed=None):
+        self.path = path
+        self.speed = speed
+    def __iter__(self):
+        with open(self.path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            first_ts = started = None
+            for ts, ticker, price in reader:
+                ts = int(ts)
+                if self.speed:
+                    if first_ts is None:
+                        first_ts, started = ts, time.monotonic()
+                    delay = (ts - first_ts) / 1e9 / self.speed - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                yield ts, ticker, float(price)
+class PollingSource:
+    # Live stand-in for a push feed: polls the batch quote endpoint every `interval`
+    # seconds and emits a tick for each price that changed
+    def __init__(self, quotes, tickers, interval=5.0, rounds=None):
+        self.quotes = quotes
+        self.tickers = tickers
+        self.interval = interval
+        self.rounds = rounds
+    def __iter__(self):
+        last = {}
+        done = 0
+        while self.rounds is None or done < self.rounds:
+            prices, _ = self.quotes.get_prices(self.tickers)
+            ts = time.time_ns()
+            for ticker, price in prices.items():
+                if last.get(ticker) != price:
+                    last[ticker] = price
+                    yield ts, ticker, price
+            done += 1
+            if self.rounds is None or done < self.rounds:
+                time.sleep(self.interval)
+def synthetic_ticks(prices, count, seed=0, volatility=0.001, start_ts=None):
+    # Random-walk ticks over the given {ticker: starting price}, one millisecond apart
+    rng = random.Random(seed)
+    prices = dict(prices)
+    tickers = list(prices)
+    ts = start_ts if start_ts is not None else time.time_ns()
+    for _ in range(count):
+        ticker = tickers[rng.randrange(len(tickers))]
+        prices[ticker] = round(max(prices[ticker] * (1 + rng.gauss(0, volatility)), 0.01), 2)
+        ts += 1_000_000
+        yield ts, ticker, prices[ticker]
+def write_replay(ticks, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ts", "ticker", "price"])
+        writer.writerows(ticks)
+class PortfolioStream:
+    # Market value of many subscribed accounts kept current tick by tick. Each ticker
+    # id maps to the (account slot, quantity) arrays of its holders, so a tick only
+    # touches the accounts that hold that ticker, and each of their totals moves by
+    # quantity * price change. Totals are recomputed exactly every `resync_every`
+    # ticks so rounding never accumulates. After a trade, call refresh(key).
+    def __init__(self, index=ticker_index, alerts=None, signals=None, resync_every=1_000_000):
+        self.index = index
+        self.alerts = alerts
+        self.signals = signals
+        self.resync_every = resync_every
+        self.prices = np.full(max(len(index.tickers), 16), np.nan)
+        self.values = np.zeros(16)
+        self.keys = []
+        self.books = []
+        self.listeners = []
+        self.ticks = 0
+        self._slots = {}
+        self._held = []
+        self._holders = {}
+        self._watchers = {}
+    def __len__(self):
+        return len(self._slots)
+    def _grow_prices(self):
+        prices = np.full(max(len(self.index.tickers), len(self.prices) * 2), np.nan)
+        prices[:len(self.prices)] = self.prices
+        self.prices = prices
+    def _attach(self, slots):
+        parts = [(slot,) + tuple(array.copy() for array in self.books[slot].arrays()[:2]) for slot in slots]
+        for slot, ids, quantity in parts:
+            self._held[slot] = (ids, quantity)
+        if len(self.index.tickers) > len(self.prices):
+            self._grow_prices()
+        ids = np.concatenate([ids for _, ids, _ in parts])
+        quantity = np.concatenate([quantity for _, _, quantity in parts])
+        owner = np.concatenate([np.full(len(ids), slot) for slot, ids, _ in parts])
+        priced = np.nan_to_num(self.prices[ids])
+        self.values[:len(self.keys)] += np.bincount(owner, weights=quantity * priced, minlength=len(self.keys))
+        # Group the new holdings by ticker id and append them to each ticker's holders
+        order = np.argsort(ids, kind="stable")
+        ids, quantity, owner = ids[order], quantity[order], owner[order]
+        bounds = np.flatnonzero(np.diff(ids)) + 1
+        for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(ids)]))):
+            if start == end:
+                continue
+            ticker_id = int(ids[start])
+            held = self._holders.get(ticker_id)
+            if held is None:
+                self._holders[ticker_id] = (owner[start:end], quantity[start:end])
+            else:
+                self._holders[ticker_id] = (np.concatenate((held[0], owner[start:end])), np.concatenate((held[1], quantity[start:end])))
+        for slot, ids, _ in parts:
+            if self.listeners[slot] is not None:
+                for ticker_id in ids.tolist():
+                    self._watchers.setdefault(ticker_id, []).append(slot)
+    def _detach(self, slot):
+        ids, _ = self._held[slot]
+        for ticker_id in ids.tolist():
+            owner, quantity = self._holders[ticker_id]
+            keep = owner != slot
+            self._holders[ticker_id] = (owner[keep], quantity[keep])
+            if ticker_id in self._watchers:
+                self._watchers[ticker_id] = [s for s in self._watchers[ticker_id] if s != slot]
+        self._held[slot] = (np.empty(0, dtype=np.int64), np.empty(0))
+        self.values[slot] = 0.0
+    def subscribe_many(self, accounts, listener=None):
+        # accounts: (key, PositionBook) pairs. listener(key, ticker, price, value) is
+        # called whenever a tick changes one of these accounts' value.
+        slots = []
+        for key, book in accounts:
+            if key in self._slots:
+                self.unsubscribe(key)
+            slot = self._slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.books.append(book)
+            self.listeners.append(listener)
+            self._held.append(None)
+            slots.append(slot)
+        if len(self.keys) > len(self.values):
+            values = np.zeros(max(len(self.keys), len(self.values) * 2))
+            values[:len(self.values)] = self.values
+            self.values = values
+        if slots:
+            self._attach(slots)
+    def subscribe(self, key, book, listener=None):
+        self.subscribe_many([(key, book)], listener)
+    def unsubscribe(self, key):
+        slot = self._slots.pop(key)
+        self._detach(slot)
+        self.books[slot] = self.listeners[slot] = None
+    def refresh(self, key):
+        slot = self._slots[key]
+        self._detach(slot)
+        self._attach([slot])
+    def value(self, key):
+        return float(self.values[self._slots[key]])
+    def revalue(self):
+        live = list(self._slots.values())
+        if not live:
+            return
+        ids = np.concatenate([self._held[slot][0] for slot in live])
+        quantity = np.concatenate([self._held[slot][1] for slot in live])
+        owner = np.concatenate([np.full(len(self._held[slot][0]), slot) for slot in live])
+        self.values[:] = 0.0
+        self.values[:len(self.keys)] = np.bincount(owner, weights=quantity * np.nan_to_num(self.prices[ids]), minlength=len(self.keys))
+    def on_tick(self, ts, ticker, price):
+        # Returns the alerts this price triggered
+        ticker_id = self.index.ids.get(ticker)
+        if ticker_id is None:
+            ticker_id = self.index.id(ticker)
+        if ticker_id >= len(self.prices):
+            self._grow_prices()
+        old = self.prices[ticker_id]
+        self.prices[ticker_id] = price
+        held = self._holders.get(ticker_id)
+        if held is not None and len(held[0]):
+            owner, quantity = held
+            # A ticker's first price adds the whole position value
+            self.values[owner] += quantity * (price - old if old == old else price)
+            for slot in self._watchers.get(ticker_id, ()):
+                self.listeners[slot](self.keys[slot], ticker, price, float(self.values[slot]))
+        self.ticks += 1
+        if self.ticks % self.resync_every == 0:
+            self.revalue()
+        if self.signals is not None:
+            self.signals.on_bar(ticker, ts - ts % DAY_NS, price)
+        return self.alerts.on_price(ticker, price) if self.alerts is not None else []
+    def run(self, source, on_alert=None):
+        ticks = triggered = 0
+        started = time.perf_counter()
+        for ts, ticker, price in source:
+            fired = self.on_tick(ts, ticker, price)
+            ticks += 1
+            if fired:
+                triggered += len(fired)
+                if on_alert is not None:
+                    on_alert(fired, price)
+        elapsed = time.perf_counter() - started
+        return {
+            "ticks": ticks,
+            "elapsed_s": elapsed,
+            "ticks_per_s": ticks / elapsed if elapsed else 0.0,
+            "accounts": len(self),
+            "alerts_triggered": triggered,
+        }
+def main(argv=None):
+    from quotes import LocalQuoteProvider
+    from screener import DEFAULT_UNIVERSE
+    from storage import AccountStore
+    from alerts import AlertEngine, describe
+    from indicators import default_signal_book
+    parser = argparse.ArgumentParser(description="Record or replay a quote stream against every account.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    record = sub.add_parser("record", help="write a synthetic replay file")
+    record.add_argument("output")
+    record.add_argument("--tickers", nargs="+", default=DEFAULT_UNIVERSE)
+    record.add_argument("--ticks", type=int, default=100_000)
+    record.add_argument("--seed", type=int, default=0)
+    replay = sub.add_parser("replay", help="stream a replay file through every account's portfolio")
+    replay.add_argument("path")
+    replay.add_argument("--speed", type=float, help="pace ticks at this multiple of real time (default: as fast as possible)")
+    replay.add_argument("--data-dir", help="directory for accounts")
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        prices, _ = LocalQuoteProvider().get_prices(args.tickers)
+        write_replay(synthetic_ticks(prices, args.ticks, args.seed), args.output)
+        print(f"Wrote {args.ticks} ticks for {len(prices)} tickers to {args.output}")
+        return
+    if args.data_dir:
+        os.environ["GROWX_DATA"] = args.data_dir
+    accounts = AccountStore()
+    alerts = AlertEngine.from_rows(accounts.alerts())
+    stream = PortfolioStream(alerts=alerts, signals=default_signal_book())
+    for chunk in accounts.portfolios():
+        books = []
+        for _, name, _, positions in chunk:
+            book = PositionBook()
+            for ticker, quantity, avg_price, investment in positions:
+                book[ticker] = (quantity, avg_price, investment)
+            books.append((name, book))
+        stream.subscribe_many(books)
+    def on_alert(fired, price):
+        for alert in fired:
+            print(f"ALERT for {alert[1]}: {describe(alert, price)}")
+        accounts.remove_alerts([alert[0] for alert in fired])
+    summary = stream.run(ReplaySource(args.path, args.speed), on_alert)
+    summary["total_value"] = float(stream.values.sum())
+    print(json.dumps(summary, indent=2))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import csv
+import io
+import os
+from bisect import bisect_left
+from settings import symbols_path
+NASDAQ_LISTINGS = (
+    ("https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt", "Symbol"),
+    ("https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt", "ACT Symbol"),
+)
+SYMBOL_COLUMNS = ("symbol", "ticker", "act symbol")
+NAME_COLUMNS = ("name", "security name", "company", "company name")
+class SymbolMaster:
+    # Every listed symbol in a dict for O(1) existence checks, plus two sorted
+    # indexes searched with bisect: symbols for ticker prefixes, and (word, symbol)
+    # pairs from company names for name autocomplete
+    def __init__(self, listings):
+        self.names = {}
+        for symbol, name in listings:
+            symbol = symbol.strip().upper()
+            if symbol:
+                self.names[symbol] = (name or "").strip()
+        self.symbols = sorted(self.names)
+        self.words = sorted({(word, symbol) for symbol, name in self.names.items() for word in name.lower().split()})
+    def __len__(self):
+        return len(self.names)
+    def __contains__(self, ticker):
+        return ticker.upper() in self.names
+    def exists(self, ticker):
+        return ticker.upper() in self.names
+    def name(self, ticker):
+        return self.names.get(ticker.upper())
+    def search(self, text, limit=10):
+        # Ticker prefix matches first (an exact ticker sorts first), then company names
+        text = text.strip()
+        if not text:
+            return []
+        found = {}
+        upper = text.upper()
+        i = bisect_left(self.symbols, upper)
+        while i < len(self.symbols) and len(found) < limit and self.symbols[i].startswith(upper):
+            found[self.symbols[i]] = self.names[self.symbols[i]]
+            i += 1
+        lower = text.lower()
+        first = lower.split()[0]
+        i = bisect_left(self.words, (first,))
+        while i < len(self.words) and len(found) < limit and self.words[i][0].startswith(first):
+            symbol = self.words[i][1]
+            if symbol not in found and lower in self.names[symbol].lower():
+                found[symbol] = self.names[symbol]
+            i += 1
+        return list(found.items())
+    @classmethod
+    def load(cls, path):
+        return cls(read_listing(path))
+def _columns(header):
+    lowered = [column.strip().lower() for column in header]
+    symbol = next((header[lowered.index(c)] for c in SYMBOL_COLUMNS if c in lowered), header[0])
+    name = next((header[lowered.index(c)] for c in NAME_COLUMNS if c in lowered), None)
+    return symbol, name
+def read_listing(path):
+    # CSV (or any delimited text) with a symbol/ticker column and an optional name column.
+    # Parquet needs pandas with pyarrow or fastparquet.
+    if path.endswith(".parquet"):
+        import pandas as pd
+        frame = pd.read_parquet(path)
+        symbol, name = _columns(list(frame.columns))
+        names = frame[name].astype(str) if name else [""] * len(frame)
+        return list(zip(frame[symbol].astype(str), names))
+    with open(path, newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",|\t")
+        except csv.Error:
+            # A single column has no delimiter to detect
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        symbol, name = _columns(reader.fieldnames)
+        return [(row[symbol], row.get(name, "") if name else "") for row in reader if row.get(symbol)]
+def fetch_listings(timeout=30):
+    import urllib.request
+    # NASDAQ Trader's daily symbol directory covers NASDAQ, NYSE and the other US exchanges
+    listings = []
+    for url, symbol_column in NASDAQ_LISTINGS:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            text = response.read().decode("utf-8", errors="replace")
+        for row in csv.DictReader(io.StringIO(text), delimiter="|"):
+            if row.get("Test Issue") == "Y" or not row.get(symbol_column) or row[symbol_column].startswith("File Creation Time"):
+                continue
+            # Yahoo writes class shares as BRK-B rather than BRK.B
+            listings.append((row[symbol_column].replace(".", "-"), row.get("Security Name", "")))
+    return listings
+def write_listing(listings, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Symbol", "Name"])
+        writer.writerows(sorted(listings))
+    os.replace(tmp, path)
+_default_master = None
+_default_loaded = False
+def default_symbol_master():
+    # None when there is no listing file; callers then fall back to a quote lookup
+    global _default_master, _default_loaded
+    if not _default_loaded:
+        path = symbols_path()
+        _default_master = SymbolMaster.load(path) if os.path.exists(path) else None
+        _default_loaded = True
+    return _default_master
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage and search the local symbol listing.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="download the US exchange listings")
+    update.add_argument("--output", help="listing file to write (default: the configured symbols file)")
+    search = sub.add_parser("search", help="autocomplete a ticker or company name")
+    search.add_argument("text")
+    search.add_argument("--limit", type=int, default=10)
+    check = sub.add_parser("check", help="check whether tickers are listed")
+    check.add_argument("tickers", nargs="+")
+    args = parser.parse_args(argv)
+    if args.command == "update":
+        listings = fetch_listings()
+        path = args.output or symbols_path()
+        write_listing(listings, path)
+        print(f"Wrote {len(listings)} symbols to {path}")
+        return
+    master = default_symbol_master()
+    if master is None:
+        parser.exit(1, f"No symbol listing at {symbols_path()}; run 'python symbols.py update' first.\n")
+    if args.command == "search":
+        for symbol, name in master.search(args.text, args.limit):
+            print(f"{symbol:<8} {name}")
+    else:
+        for ticker in args.tickers:
+            print(f"{ticker.upper():<8} {'listed' if master.exists(ticker) else 'not listed'}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import threading
+from fetch import RateLimited, ScheduledQuoteProvider
+from quotes import QuoteNotFound, QuoteProvider
+class BatchProvider(QuoteProvider):
+    # Answers batches like yf.download: tickers in `throttled` come back as empty
+    # columns, while get_price raises 429 for them once before answering
+    def __init__(self, prices, throttled=()):
+        self.prices = prices
+        self.throttled = set(throttled)
+        self.workers = []
+        self.single = []
+        self._lock = threading.Lock()
+    def get_prices(self, tickers, max_workers=8):
+        self.workers.append(max_workers)
+        prices = {t: self.prices[t] for t in tickers if t in self.prices and t not in self.throttled}
+        return prices, {t: QuoteNotFound(t) for t in tickers if t not in prices}
+    def get_price(self, ticker):
+        with self._lock:
+            self.single.append(ticker)
+            if ticker in self.throttled:
+                self.throttled.discard(ticker)
+                raise RateLimited()
+        if ticker not in self.prices:
+            raise QuoteNotFound(ticker)
+        return self.prices[ticker]
+def scheduler(provider, **kwargs):
+    return ScheduledQuoteProvider(provider, rate=1000.0, burst=100, backoff=0.001, seed=0, **kwargs)
+def test_empty_batch_columns_are_retried_one_by_one():
+    provider = BatchProvider({"AAPL": 1.0, "MSFT": 2.0, "NVDA": 3.0}, throttled={"MSFT", "NVDA"})
+    quotes = scheduler(provider)
+    prices, errors = quotes.get_prices(["AAPL", "MSFT", "NVDA", "NOPE"])
+    assert prices == {"AAPL": 1.0, "MSFT": 2.0, "NVDA": 3.0}
+    assert isinstance(errors["NOPE"], QuoteNotFound)
+    assert sorted(provider.single) == ["MSFT", "MSFT", "NOPE", "NVDA", "NVDA"]
+    assert quotes.throttled == 2
+def test_batches_pay_per_ticker_and_respect_the_concurrency_cap():
+    tickers = [f"T{i}" for i in range(20)]
+    provider = BatchProvider({ticker: 1.0 for ticker in tickers})
+    quotes = ScheduledQuoteProvider(provider, rate=0.001, burst=30, max_concurrency=4)
+    prices, errors = quotes.get_prices(tickers, max_workers=8)
+    assert len(prices) == 20 and not errors
+    assert provider.workers == [4]
+    assert 9.9 < quotes.bucket.tokens < 10.1
@@ -0,0 +1,27 @@
+from headless import CommandRunner
+from ledger import Ledger
+from quotes import LocalQuoteProvider
+from storage import AccountStore
+def test_non_object_lines_fail_alone(tmp_path):
+    runner = CommandRunner(LocalQuoteProvider(), accounts=AccountStore(str(tmp_path / "accounts.db")), ledger=Ledger(str(tmp_path / "ledger.jsonl")))
+    try:
+        results = list(runner.run(['5', '"deposit"', '[1]', '{"op": "signup", "name": "ann", "email": "a@b.c", "password": "pw"}']))
+    finally:
+        runner.close()
+    assert [result["ok"] for result in results] == [False, False, False, True]
+    assert results[0]["error"] == "Invalid command: expected a JSON object"
+def test_unwatch_cancels_the_tickers_alerts(tmp_path):
+    accounts = AccountStore(str(tmp_path / "accounts.db"))
+    runner = CommandRunner(LocalQuoteProvider(), accounts=accounts, ledger=Ledger(str(tmp_path / "ledger.jsonl")))
+    try:
+        runner.execute({"op": "signup", "name": "ann", "email": "a@b.c", "password": "pw"})
+        runner.execute({"op": "watch", "user": "ann", "ticker": "AAPL"})
+        runner.execute({"op": "watch", "user": "ann", "ticker": "MSFT"})
+        runner.execute({"op": "alert", "user": "ann", "ticker": "AAPL", "direction": "above", "threshold": 500})
+        runner.execute({"op": "alert", "user": "ann", "ticker": "MSFT", "direction": "below", "threshold": 100})
+        result = runner.execute({"op": "unwatch", "user": "ann", "ticker": "aapl"})
+        assert len(result["cancelled_alerts"]) == 1
+        assert [alert["ticker"] for alert in runner.execute({"op": "alerts", "user": "ann"})["alerts"]] == ["MSFT"]
+        assert [row[2] for row in accounts.alerts()] == ["MSFT"]
+    finally:
+        runner.close()
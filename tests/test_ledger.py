@@ -0,0 +1,130 @@
+import json
+import sqlite3
+import pytest
+import ledger as ledger_module
+from GrowX import User
+from ledger import Ledger, reconcile
+from quotes import LocalQuoteProvider
+from storage import AccountStore
+from trading import LedgerMismatch, TradingService
+@pytest.fixture
+def service(tmp_path):
+    accounts = AccountStore(str(tmp_path / "accounts.db"))
+    ledger = Ledger(str(tmp_path / "ledger.jsonl"))
+    user = User("ann", "ann@example.com", "secret", "555")
+    accounts.create_user(user)
+    trading = TradingService(LocalQuoteProvider(), accounts, ledger, User.from_record)
+    trading.deposit(user, 1000)
+    trading.buy(user, "AAPL", 2, price=100.0)
+    yield trading, user
+    ledger.close()
+    accounts.close()
+def stored(trading):
+    user = trading.load_user("ann")
+    return user.balance, dict(user.portfolio.items())
+def lines(path):
+    with open(path, "rb") as f:
+        return f.read().split(b"\n")
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = Ledger(path)
+    ledger.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 100})
+    ledger.close()
+    with open(path, "ab") as f:
+        f.write(b'{"user":"ann","kind":"deposit","amou')
+    ledger = Ledger(path)
+    ledger.append({"user": "ann", "kind": "withdraw", "ticker": None, "amount": -40})
+    ledger.close()
+    complete = [json.loads(line) for line in lines(path) if line]
+    assert [entry["seq"] for entry in complete] == [1, 2]
+    assert Ledger(path).replay() == {"ann": {"balance": 60, "positions": {}}}
+def test_two_writers_share_one_sequence(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    first = Ledger(path)
+    second = Ledger(path)
+    first.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 100})
+    second.append({"user": "ann", "kind": "withdraw", "ticker": None, "amount": -50})
+    first.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 5})
+    second.close()
+    assert [json.loads(line)["seq"] for line in lines(path) if line] == [1, 2, 3]
+    assert first.replay() == {"ann": {"balance": 55, "positions": {}}}
+    first.close()
+def test_replay_sums_position_deltas(tmp_path):
+    ledger = Ledger(str(tmp_path / "ledger.jsonl"))
+    ledger.append_many([
+        {"user": "ann", "kind": "buy", "ticker": "AAPL", "amount": -200.0, "delta": [2, 200.0]},
+        {"user": "ann", "kind": "buy", "ticker": "AAPL", "amount": -400.0, "delta": [2, 400.0]},
+        {"user": "ann", "kind": "sell", "ticker": "AAPL", "amount": 450.0, "delta": [-1, -150.0]},
+        {"user": "ann", "kind": "buy", "ticker": "MSFT", "amount": -50.0, "delta": [1, 50.0]},
+        {"user": "ann", "kind": "sell", "ticker": "MSFT", "amount": 60.0, "delta": [-1, -50.0]},
+    ])
+    assert ledger.replay() == {"ann": {"balance": -140.0, "positions": {"AAPL": (3, 150.0, 450.0)}}}
+    ledger.close()
+def test_replay_ignores_partial_last_line(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = Ledger(path)
+    ledger.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 100})
+    with open(path, "ab") as f:
+        f.write(b'{"user":"ann","kind":"deposit","balance":999,"seq":2')
+    assert ledger.replay() == {"ann": {"balance": 100, "positions": {}}}
+    ledger.close()
+def test_failed_write_is_cut_from_the_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = Ledger(path)
+    ledger.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 100})
+    size = (tmp_path / "ledger.jsonl").stat().st_size
+    def fail(fd):
+        raise OSError("fsync failed")
+    monkeypatch.setattr(ledger_module.os, "fsync", fail)
+    with pytest.raises(OSError):
+        ledger.append({"user": "ann", "kind": "deposit", "ticker": None, "amount": 5})
+    monkeypatch.undo()
+    assert (tmp_path / "ledger.jsonl").stat().st_size == size
+    ledger.close()
+def test_failed_append_rolls_back_the_user(service, monkeypatch):
+    trading, user = service
+    def fail(entries, wait=True):
+        raise OSError("disk full")
+    monkeypatch.setattr(trading.ledger, "append_many", fail)
+    with pytest.raises(OSError):
+        trading.sell(user, "AAPL", 1, price=150.0)
+    assert user.balance == 800
+    assert user.portfolio["AAPL"] == (2, 100.0, 200.0)
+    assert stored(trading) == (800, {"AAPL": (2, 100.0, 200.0)})
+def test_failed_store_write_is_reversed_in_the_ledger(service, monkeypatch):
+    trading, user = service
+    def fail(trades):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(trading.accounts, "record_trades", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        trading.sell(user, "AAPL", 1, price=150.0)
+    monkeypatch.undo()
+    assert user.balance == 800
+    assert user.portfolio["AAPL"] == (2, 100.0, 200.0)
+    assert [entry["kind"] for entry in map(json.loads, filter(None, lines(trading.ledger.path)))][-2:] == ["sell", "reversal"]
+    assert reconcile(trading.ledger.replay(), trading.accounts) == []
+def test_failed_reversal_reports_the_mismatch(service, monkeypatch):
+    trading, user = service
+    append_many = trading.ledger.append_many
+    calls = []
+    def fail_second(entries, wait=True):
+        calls.append(entries)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return append_many(entries, wait)
+    def fail(trades):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(trading.ledger, "append_many", fail_second)
+    monkeypatch.setattr(trading.accounts, "record_trades", fail)
+    with pytest.raises(LedgerMismatch):
+        trading.deposit(user, 50)
+    monkeypatch.undo()
+    assert reconcile(trading.ledger.replay(), trading.accounts) == ["ann: store balance 800.0 vs ledger 850.0"]
+def test_snapshot_replays_with_the_tail(service):
+    trading, user = service
+    trading.ledger.snapshot()
+    trading.sell(user, "AAPL", 1, price=150.0)
+    state = trading.ledger.replay()
+    assert state["ann"]["balance"] == 950
+    assert state["ann"]["positions"]["AAPL"] == (1, 100.0, 100.0)
+    assert reconcile(state, trading.accounts) == []
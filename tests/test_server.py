@@ -0,0 +1,14 @@
+import pytest
+from server import authorize
+@pytest.mark.parametrize("command", [
+    {"op": "chart", "tickers": ["../../../ESCAPED"]},
+    {"op": "screen", "tickers": ["..\\\\ESCAPED"]},
+    {"op": "chart", "tickers": ["AAPL"], "period": "../1y"},
+    {"op": "chart", "tickers": ["AAPL"], "fmt": "../png"},
+    {"op": "buy", "ticker": "../AAPL", "quantity": 1},
+    {"op": "orders", "orders": [{"side": "buy", "ticker": "/etc/AAPL", "quantity": 1}]},
+])
+def test_file_name_arguments_are_checked(command):
+    assert authorize(command, "ann") is not None
+def test_index_and_fx_tickers_are_allowed():
+    assert authorize({"op": "screen", "tickers": ["^GSPC", "BRK.B", "EURUSD=X"], "period": "6mo"}, None) is None
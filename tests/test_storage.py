@@ -0,0 +1,53 @@
+import datetime
+import pytest
+from GrowX import User
+from ledger import Ledger, reconcile
+from quotes import LocalQuoteProvider
+from sip_engine import SipEngine
+from storage import AccountStore
+from trading import TradingService
+@pytest.fixture
+def store(tmp_path):
+    accounts = AccountStore(str(tmp_path / "accounts.db"))
+    user = User("ann", "ann@example.com", "secret", "555")
+    accounts.create_user(user)
+    yield accounts, user
+    accounts.close()
+def position(accounts, user, ticker):
+    fresh = User("ann", "", "", "")
+    fresh.id = user.id
+    accounts.load_portfolio(fresh)
+    return fresh.portfolio.get(ticker)
+def test_add_position_keeps_avg_price_and_drops_empty_rows(store):
+    accounts, user = store
+    accounts.record_trades([(user, -200.0, {"AAPL": (2, 200.0)})])
+    assert position(accounts, user, "AAPL") == (2, 100.0, 200.0)
+    accounts.record_trades([(user, -400.0, {"AAPL": (2, 400.0)})])
+    assert position(accounts, user, "AAPL") == (4, 150.0, 600.0)
+    # A partial sell takes out cost at the average price, which stays put
+    accounts.record_trades([(user, 450.0, {"AAPL": (-1, -150.0)})])
+    assert position(accounts, user, "AAPL") == (3, 150.0, 450.0)
+    accounts.record_trades([(user, 600.0, {"AAPL": (-3, -450.0)})])
+    assert position(accounts, user, "AAPL") is None
+    assert accounts.find_user("ann")[5] == 450.0
+def test_stale_session_keeps_a_sip_run(tmp_path, store):
+    accounts, user = store
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = Ledger(path)
+    quotes = LocalQuoteProvider()
+    trading = TradingService(quotes, accounts, ledger, User.from_record)
+    trading.deposit(user, 1000)
+    trading.buy(user, "AAPL", 2, price=100.0)
+    session = trading.load_user("ann")
+    trading.subscribe_sip(user, "Tech", 500, datetime.date(2026, 1, 5))
+    # The SIP engine runs as its own process, with its own Ledger on the same file
+    sip_ledger = Ledger(path)
+    SipEngine(quotes, accounts, {"Tech": {"AAPL": 1.0}}, sip_ledger).run_due(datetime.date(2026, 1, 5))
+    sip_ledger.close()
+    sip_price = quotes.get_price("AAPL")
+    # The session loaded before the run still holds 800 and 2 shares
+    trading.sell(session, "AAPL", 1, price=120.0)
+    assert accounts.find_user("ann")[5] == pytest.approx(800 - sip_price + 120)
+    assert position(accounts, user, "AAPL")[0] == 2
+    assert reconcile(ledger.replay(), accounts) == []
+    ledger.close()
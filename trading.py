@@ -0,0 +1,239 @@
+import calendar
+import datetime
+from ledger import ledger_entry, reversals
+from metrics import timed
+class TradeError(ValueError):
+    pass
+class LedgerMismatch(RuntimeError):
+    # The ledger holds a change the account store doesn't, and reversing it failed too
+    pass
+def add_months(day, months=1, day_of_month=None):
+    # Clamped to the month's length; pass day_of_month to keep a plan's original day
+    # (the 31st) after a short month instead of drifting to the 29th
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day_of_month or day.day, calendar.monthrange(year, month)[1]))
+def checkpoint(user, tickers=()):
+    # The balance and positions an operation may change: commit() stores the difference
+    # from these, and puts them back if the commit fails
+    return user, user.balance, {ticker: user.portfolio.get(ticker) for ticker in tickers}
+def changes(saved):
+    # (user, cash delta, {ticker: (quantity delta, investment delta)}) since a checkpoint
+    user, balance, positions = saved
+    moved = {}
+    for ticker, before in positions.items():
+        after = user.portfolio.get(ticker) or (0, 0.0, 0.0)
+        before = before or (0, 0.0, 0.0)
+        if after[0] != before[0] or after[2] != before[2]:
+            moved[ticker] = (after[0] - before[0], after[2] - before[2])
+    return user, user.balance - balance, moved
+def restore(checkpoints):
+    for user, balance, positions in checkpoints:
+        user.balance = balance
+        for ticker, position in positions.items():
+            if position is None:
+                if ticker in user.portfolio:
+                    del user.portfolio[ticker]
+            else:
+                user.portfolio[ticker] = position
+class TradingService:
+    # Every change to cash or positions goes through here so it reaches the
+    # ledger and the account store. Methods never print; they raise TradeError
+    # with a user-facing message instead.
+    def __init__(self, quotes, accounts=None, ledger=None, user_factory=None):
+        self.quotes = quotes
+        self.accounts = accounts
+        self.ledger = ledger
+        self.user_factory = user_factory
+    @timed("growx_account_commit")
+    def commit(self, users_and_entries, checkpoints=()):
+        # users_and_entries: list of (user, [ledger entries]) written with one
+        # ledger group commit and one account store transaction. The store applies the
+        # changes since checkpoints. The ledger is the record: if its append fails
+        # nothing happened and the users are restored, but once it has succeeded a
+        # failed store write is undone by appending reversing entries, not forgotten.
+        entries = [entry for _, user_entries in users_and_entries for entry in user_entries]
+        if not entries:
+            return
+        moved = [changes(saved) for saved in checkpoints]
+        try:
+            if self.ledger is not None:
+                self.ledger.append_many(entries)
+        except BaseException:
+            restore(checkpoints)
+            raise
+        if self.accounts is None:
+            return
+        try:
+            self.accounts.record_trades(moved)
+        except BaseException as error:
+            restore(checkpoints)
+            if self.ledger is not None:
+                try:
+                    self.ledger.append_many(reversals(entries))
+                except Exception as e:
+                    raise LedgerMismatch(
+                        f"The ledger recorded a change the account store didn't ({error}), and reversing it failed ({e}). "
+                        "Run `python ledger.py verify --repair` to rebuild the store from the ledger."
+                    ) from error
+            raise
+    def load_user(self, name):
+        record = self.accounts.find_user(name) if self.accounts is not None else None
+        if record is None:
+            raise TradeError(f"User not found: {name}")
+        user = self.user_factory(*record)
+        self.accounts.load_portfolio(user)
+        return user
+    def _checkpoint(self, user, tickers=()):
+        # Starts from the stored account, not a copy loaded before a SIP run or another session's trade
+        if self.accounts is not None and getattr(user, "id", None) is not None:
+            self.accounts.refresh(user, tickers)
+        return checkpoint(user, tickers)
+    def _deposit(self, user, amount):
+        if amount <= 0:
+            raise TradeError("Amount must be positive.")
+        user.balance += amount
+        return {"amount": amount, "balance": user.balance}, ledger_entry(user, "deposit", amount=amount)
+    def _withdraw(self, user, amount):
+        if amount <= 0:
+            raise TradeError("Amount must be positive.")
+        if amount > user.balance:
+            raise TradeError(f"Insufficient funds. Current balance: ${user.balance}")
+        user.balance -= amount
+        return {"amount": amount, "balance": user.balance}, ledger_entry(user, "withdraw", amount=-amount)
+    def _buy(self, user, ticker, quantity, price):
+        if quantity <= 0:
+            raise TradeError("Quantity must be positive.")
+        total_cost = price * quantity
+        if total_cost > user.balance:
+            raise TradeError(f"Insufficient funds. Required: ${total_cost:.2f}, Available: ${user.balance:.2f}")
+        user.record_buy(ticker, quantity, price)
+        result = {"ticker": ticker, "quantity": quantity, "price": price, "total_cost": total_cost, "balance": user.balance}
+        return result, ledger_entry(user, "buy", ticker, quantity, price, -total_cost, (quantity, total_cost))
+    def _sell(self, user, ticker, quantity, price):
+        if ticker not in user.portfolio:
+            raise TradeError(f"You don't own any shares of {ticker}.")
+        before = user.portfolio[ticker]
+        owned_quantity = before[0]
+        if quantity <= 0:
+            raise TradeError("Quantity must be positive.")
+        if quantity > owned_quantity:
+            raise TradeError(f"You only own {owned_quantity} shares of {ticker}.")
+        sale_value, profit_loss = user.record_sell(ticker, quantity, price)
+        after = user.portfolio.get(ticker) or (0, 0.0, 0.0)
+        result = {
+            "ticker": ticker,
+            "quantity": quantity,
+            "price": price,
+            "sale_value": sale_value,
+            "profit_loss": profit_loss,
+            "balance": user.balance,
+        }
+        delta = (after[0] - before[0], after[2] - before[2])
+        return result, ledger_entry(user, "sell", ticker, quantity, price, sale_value, delta)
+    @timed("growx_trade", op="deposit")
+    def deposit(self, user, amount):
+        saved = self._checkpoint(user)
+        result, entry = self._deposit(user, amount)
+        self.commit([(user, [entry])], [saved])
+        return result
+    @timed("growx_trade", op="withdraw")
+    def withdraw(self, user, amount):
+        saved = self._checkpoint(user)
+        result, entry = self._withdraw(user, amount)
+        self.commit([(user, [entry])], [saved])
+        return result
+    @timed("growx_trade", op="buy")
+    def buy(self, user, ticker, quantity, price=None):
+        ticker = ticker.upper()
+        if price is None:
+            price = self.quotes.get_price(ticker)
+        saved = self._checkpoint(user, [ticker])
+        result, entry = self._buy(user, ticker, quantity, price)
+        self.commit([(user, [entry])], [saved])
+        return result
+    @timed("growx_trade", op="sell")
+    def sell(self, user, ticker, quantity, price=None):
+        ticker = ticker.upper()
+        saved = self._checkpoint(user, [ticker])
+        if price is None and ticker in user.portfolio:
+            price = self.quotes.get_price(ticker)
+        result, entry = self._sell(user, ticker, quantity, price)
+        self.commit([(user, [entry])], [saved])
+        return result
+    @timed("growx_trade", op="sip")
+    def sip(self, user, allocation, amount, prices=None):
+        saved = self._checkpoint(user, allocation)
+        if amount > user.balance:
+            raise TradeError(f"Insufficient funds. Required: ${amount:.2f}, Available: ${user.balance:.2f}")
+        errors = {}
+        if prices is None:
+            prices, errors = self.quotes.get_prices(allocation)
+        purchases = []
+        entries = []
+        for ticker, percentage in allocation.items():
+            if ticker not in prices:
+                continue
+            price = prices[ticker]
+            quantity = (amount * percentage) // price
+            if quantity > 0:
+                total_cost = user.record_buy(ticker, quantity, price)
+                purchases.append({"ticker": ticker, "quantity": quantity, "price": price, "total_cost": total_cost})
+                entries.append(ledger_entry(user, "sip", ticker, quantity, price, -total_cost, (quantity, total_cost)))
+        self.commit([(user, entries)], [saved])
+        return purchases, errors
+    def subscribe_sip(self, user, sector, amount, start=None):
+        # Registers a recurring monthly SIP, first run a month from today unless start is given
+        if self.accounts is None:
+            raise TradeError("Recurring SIPs need an account store.")
+        if amount <= 0:
+            raise TradeError("Amount must be positive.")
+        start = start or add_months(datetime.date.today())
+        return self.accounts.add_sip_plan(user, sector, amount, start.isoformat())
+    @timed("growx_trade", op="orders")
+    def submit_orders(self, orders, users=None):
+        # Bulk API for batch jobs. Each order is a dict with "user", "side"
+        # ("buy"/"sell"), "ticker" and "quantity", plus an optional "price".
+        # Prices are fetched once for the whole batch and everything is made
+        # durable together; a failing order is reported without stopping the rest.
+        users = {} if users is None else users
+        orders = list(orders)
+        prices, price_errors = self.quotes.get_prices(
+            {order["ticker"] for order in orders if order.get("price") is None}
+        )
+        results = []
+        touched = {}
+        saved = {}
+        for order in orders:
+            try:
+                name = order["user"]
+                if name not in users:
+                    users[name] = self.load_user(name)
+                user = users[name]
+                ticker = order["ticker"].upper()
+                price = order.get("price")
+                if price is None:
+                    if ticker in price_errors:
+                        raise price_errors[ticker]
+                    price = prices[ticker]
+                if name not in saved:
+                    saved[name] = self._checkpoint(user)
+                positions = saved[name][2]
+                if ticker not in positions:
+                    # First order for this ticker: read the stored position, keep the batch's balance
+                    if self.accounts is not None and getattr(user, "id", None) is not None:
+                        self.accounts.refresh(user, [ticker], balance=False)
+                    positions[ticker] = user.portfolio.get(ticker)
+                if order["side"] == "buy":
+                    result, entry = self._buy(user, ticker, order["quantity"], price)
+                elif order["side"] == "sell":
+                    result, entry = self._sell(user, ticker, order["quantity"], price)
+                else:
+                    raise TradeError(f"Unknown order side: {order['side']}")
+                touched.setdefault(name, (user, []))[1].append(entry)
+                results.append({"ok": True, "user": name, "side": order["side"], **result})
+            except Exception as e:
+                results.append({"ok": False, "order": order, "error": str(e)})
+        self.commit(list(touched.values()), list(saved.values()))
+        return results